@@ -1,9 +1,24 @@
+from django.utils.decorators import method_decorator
 from django.views.generic.base import TemplateView
 
+from core.cache import cache_page_tagged
+from core.replicas import read_only
 
+ABOUT_CACHE_TIMEOUT = 60 * 60 * 24
+
+cache_about = method_decorator(
+    cache_page_tagged(ABOUT_CACHE_TIMEOUT, lambda: ['about']),
+    name='dispatch'
+)
+
+
+@method_decorator(read_only, name='dispatch')
+@cache_about
 class AboutAuthorView(TemplateView):
     template_name = 'about/author.html'
 
 
+@method_decorator(read_only, name='dispatch')
+@cache_about
 class AboutTechView(TemplateView):
     template_name = 'about/tech.html'
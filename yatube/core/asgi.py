@@ -0,0 +1,137 @@
+"""Запуск Django 2.2 под ASGI-сервером.
+
+В Django 2.2 нет ни ASGI, ни асинхронных представлений, поэтому
+WsgiToAsgi выполняет обычное WSGI-приложение в ограниченном пуле
+потоков (ASGI_THREADS). Цикл событий сервера при этом сам принимает
+соединения и читает тела запросов, так что медленный клиент держит
+только корутину, а не поток с Django. Ответ собирается в потоке
+целиком: закрытие ответа закрывает соединения с БД того же потока.
+
+Запрос целиком выполняется в одном потоке пула, хотя в некоторых
+представлениях есть независимые части: например, на странице профиля
+поиск автора со счётчиками и проверка подписки. Разнести их по потокам
+нельзя без потери общего соединения, транзакции и выбранной реплики,
+которые Django и core.replicas хранят в потоке запроса.
+"""
+import asyncio
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+
+
+class WsgiToAsgi:
+    def __init__(self, wsgi_application, max_workers=None):
+        self.wsgi_application = wsgi_application
+        self.pool = ThreadPoolExecutor(
+            max_workers=max_workers or settings.ASGI_THREADS,
+            thread_name_prefix='asgi'
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self.http(scope, receive, send)
+        else:
+            raise ValueError(
+                'Неподдерживаемый тип соединения: {}'.format(scope['type'])
+            )
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.pool.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def http(self, scope, receive, send):
+        body = await self.read_body(receive)
+        if body is None:
+            return
+        loop = asyncio.get_running_loop()
+        with body:
+            status, headers, content = await loop.run_in_executor(
+                self.pool, self.run, environ(scope, body)
+            )
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': headers,
+        })
+        await send({'type': 'http.response.body', 'body': content})
+
+    async def read_body(self, receive):
+        """Тело запроса; None, если клиент ушёл, не дослав его."""
+        body = SpooledTemporaryFile(
+            max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+        )
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                body.close()
+                return None
+            body.write(message.get('body', b''))
+            if not message.get('more_body', False):
+                body.seek(0)
+                return body
+
+    def run(self, environ):
+        """Выполняет WSGI-приложение и возвращает (код, заголовки, тело)."""
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started['status'] = int(status.split(' ', 1)[0])
+            started['headers'] = [
+                (name.lower().encode('latin-1'), value.encode('latin-1'))
+                for name, value in headers
+            ]
+
+        result = self.wsgi_application(environ, start_response)
+        try:
+            content = b''.join(result)
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+        return started['status'], started['headers'], content
+
+
+def environ(scope, body):
+    """WSGI-окружение запроса из ASGI-описания соединения."""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('127.0.0.1', 0)
+    path = scope['path'].encode('utf-8').decode('latin-1')
+    root_path = scope.get('root_path', '').encode('utf-8').decode('latin-1')
+    if path.startswith(root_path):
+        path = path[len(root_path):]
+    result = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': root_path,
+        'PATH_INFO': path,
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': 'HTTP/' + scope.get('http_version', '1.1'),
+        'REMOTE_ADDR': client[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = f'HTTP_{name}'
+        if name in result:
+            separator = '; ' if name == 'HTTP_COOKIE' else ','
+            value = result[name] + separator + value
+        result[name] = value
+    return result
@@ -0,0 +1,252 @@
+"""Кэш страниц, который сбрасывается по событиям, а не по таймеру.
+
+Каждая страница зависит от набора тегов (например, `posts` или
+`post:15`). Текущая версия тега хранится в кэше и запоминается вместе
+со страницей, поэтому увеличение версии тега делает устаревшими все
+страницы с этим тегом без перебора ключей. Устаревшая страница
+отдаётся, пока один запрос строит новую (см. fetch).
+
+Личные части страниц (см. core.personal) в кэш не попадают: страница
+анонимного посетителя кэшируется целиком, а для вошедших кэшируется
+общая для всех основа с метками, куда при каждом ответе вставляются
+фрагменты конкретного пользователя.
+"""
+import hashlib
+import math
+import pickle
+import random
+import threading
+import time
+from functools import wraps
+
+from django.core.cache import cache
+
+from . import personal, replicas
+
+TAG_KEY = 'tag:{}'
+PAGE_KEY = 'page:{path}:{variant}'
+LOCK_KEY = 'lock:{}'
+# Сколько после истечения срока запись ещё отдаётся, пока её пересчитывают.
+STALE_TIMEOUT = 60 * 10
+LOCK_TIMEOUT = 30
+# Сколько ждать значения, которое вычисляет другой процесс, если
+# устаревшего нет, и как часто проверять кэш.
+LOCK_WAIT = 2
+LOCK_POLL = 0.05
+# Дольше ждать вычисления в соседнем потоке незачем: блокировка
+# в кэше к этому времени тоже истечёт.
+FLIGHT_WAIT = LOCK_TIMEOUT
+EARLY_EXPIRY_BETA = 1.0
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+def _new_version():
+    # Версия, созданная после вытеснения тега из кэша, больше всех
+    # прежних версий, и старые страницы не воскресают.
+    return int(time.time() * 1000)
+
+
+def get_tag_versions(tags):
+    """Текущие версии тегов; недостающие теги создаются."""
+    keys = [TAG_KEY.format(tag) for tag in tags]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            version = _new_version()
+            if not cache.add(key, version, None):
+                version = cache.get(key, version)
+            versions[key] = version
+    return [versions[key] for key in keys]
+
+
+def bump_tags(*tags):
+    """Делает устаревшими все страницы, зависящие от тегов."""
+    for tag in tags:
+        key = TAG_KEY.format(tag)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _new_version(), None)
+
+
+def _variant(request):
+    """Часть ключа: анонимам — готовая страница, вошедшим — с метками."""
+    return 'user' if request.user.is_authenticated else 'anon'
+
+
+def page_key(request, tags):
+    """Ключ страницы и версия, которую должна иметь свежая запись."""
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    version = '.'.join(str(version) for version in get_tag_versions(tags))
+    return PAGE_KEY.format(path=path, variant=_variant(request)), version
+
+
+class _Flight:
+    """Вычисление значения, которого ждут другие потоки процесса."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.waiters = 0
+        self.payload = None
+        self.error = None
+
+
+def _follow(flight, compute):
+    """Результат вычисления, которое ведёт другой поток процесса."""
+    if not flight.done.wait(FLIGHT_WAIT):
+        return compute()[0]
+    if flight.error is not None:
+        raise flight.error
+    if flight.payload is None:
+        return compute()[0]
+    return pickle.loads(flight.payload)
+
+
+def _single_flight(key, compute, stale):
+    """Одно вычисление `key` на процесс; остальные потоки его ждут.
+
+    Ожидающие получают копию значения, чтобы не делить изменяемый
+    объект с вычислившим его потоком, или ту же ошибку. Если есть
+    устаревшая запись, ждать незачем — её и отдаём; не дождавшись
+    вычисления за FLIGHT_WAIT, поток считает значение сам.
+    """
+    with _flights_lock:
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _flights[key] = _Flight()
+        elif stale is None:
+            flight.waiters += 1
+    if not leader:
+        if stale is not None:
+            return stale[0]
+        return _follow(flight, compute)
+    try:
+        value, shared = compute()
+        with _flights_lock:
+            del _flights[key]
+            waiters = flight.waiters
+        if shared and waiters:
+            flight.payload = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        return value
+    except Exception as error:
+        flight.error = error
+        raise
+    finally:
+        with _flights_lock:
+            if _flights.get(key) is flight:
+                del _flights[key]
+        flight.done.set()
+
+
+def _expired(entry, version):
+    """Запись устарела, или пора обновить её чуть раньше срока.
+
+    Вероятность раннего обновления растёт к концу срока и с временем
+    вычисления (XFetch), так что обычно запись обновляет один запрос,
+    а не все, пришедшие в момент истечения.
+    """
+    entry_version, expires, delta = entry[1:]
+    if entry_version != version:
+        return True
+    early = -delta * EARLY_EXPIRY_BETA * math.log(1 - random.random())
+    return time.time() + early >= expires
+
+
+def _await(key, version):
+    """Ждёт, пока значение вычислит другой процесс, державший блокировку."""
+    deadline = time.monotonic() + LOCK_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(LOCK_POLL)
+        entry = cache.get(key)
+        if entry is not None and entry[1] == version:
+            return entry
+    return None
+
+
+def fetch(key, compute, timeout, version=None, cacheable=None):
+    """Значение из кэша, защищённое от одновременного пересчёта.
+
+    Пока одно значение пересчитывается (блокировка `lock:<key>` в кэше),
+    остальные запросы получают устаревшее, если оно есть. Запись живёт
+    `timeout` секунд свежей и ещё STALE_TIMEOUT — устаревшей; смена
+    `version` тоже делает её устаревшей. `cacheable(value)` решает,
+    можно ли сохранить вычисленное значение.
+    """
+    entry = cache.get(key)
+    if entry is not None and not _expired(entry, version):
+        return entry[0]
+
+    def refresh():
+        lock = LOCK_KEY.format(key)
+        locked = cache.add(lock, True, LOCK_TIMEOUT)
+        if not locked:
+            if entry is not None:
+                return entry[0], True
+            ready = _await(key, version)
+            if ready is not None:
+                return ready[0], True
+        try:
+            started = time.monotonic()
+            # В общий кэш не должна попасть копия с отставшей реплики.
+            with replicas.primary():
+                value = compute()
+            shared = cacheable is None or cacheable(value)
+            if shared:
+                cache.set(key, (
+                    value, version, time.time() + timeout,
+                    time.monotonic() - started
+                ), timeout + STALE_TIMEOUT)
+        finally:
+            if locked:
+                cache.delete(lock)
+        return value, shared
+
+    return _single_flight(key, refresh, entry)
+
+
+def _cacheable(response):
+    return (
+        response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+    )
+
+
+def _fill(request, response):
+    if not response.streaming:
+        response.content = personal.fill(request, response.content)
+
+
+def cache_page_tagged(timeout, tags):
+    """Кэширует страницу до истечения `timeout` или изменения тегов.
+
+    `tags` получает именованные аргументы представления и возвращает
+    список тегов страницы. Пока страница пересчитывается, остальные
+    посетители получают её прежнюю версию (см. fetch).
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view_func(request, *args, **kwargs)
+            personal.start(request)
+            anonymous = not request.user.is_authenticated
+
+            def compute():
+                response = view_func(request, *args, **kwargs)
+                if callable(getattr(response, 'render', None)):
+                    response = response.render()
+                if anonymous:
+                    _fill(request, response)
+                return response
+
+            key, version = page_key(request, tags(**kwargs))
+            response = fetch(key, compute, timeout, version, _cacheable)
+            if not anonymous:
+                _fill(request, response)
+            return response
+        return wrapper
+    return decorator
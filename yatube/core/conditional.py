@@ -0,0 +1,58 @@
+"""Ответ 304 Not Modified для страниц, которые не менялись.
+
+Представлению нужна функция, которая по его аргументам дешёвым
+запросом находит время последнего изменения страницы. ETag зависит от
+этого времени и от посетителя: вошедшим пользователям страница
+показывается со своей шапкой и формами. Last-Modified отдаётся только
+анонимам — он не различает посетителей.
+
+Имена авторов и названия групп выводятся на многих страницах, а их
+правка не меняет времени изменения каждой из них. Поэтому в ETag входят
+и версии тегов кэша страниц (см. core.cache), которые эти правки
+сбрасывают.
+"""
+import hashlib
+
+from django.conf import settings
+from django.views.decorators.http import condition
+
+from .cache import _variant, get_tag_versions
+
+
+def _visitor(request):
+    variant = _variant(request)
+    if not request.user.is_authenticated:
+        return variant
+    token = request.COOKIES.get(settings.CSRF_COOKIE_NAME, '')
+    return '{}.{}.{}'.format(
+        variant, request.user.pk, hashlib.md5(token.encode()).hexdigest()
+    )
+
+
+def conditional(modified, tags=()):
+    """Отвечает 304, если страница не менялась с прошлого визита.
+
+    `modified` получает именованные аргументы представления и
+    возвращает время изменения страницы или None, если его не найти.
+    `tags` — теги кэша, при сбросе которых страница тоже меняется.
+    """
+    def last_change(request, **kwargs):
+        if not hasattr(request, 'last_change'):
+            request.last_change = modified(**kwargs)
+        return request.last_change
+
+    def etag(request, *args, **kwargs):
+        moment = last_change(request, **kwargs)
+        if moment is None:
+            return None
+        versions = '.'.join(str(version) for version in get_tag_versions(tags))
+        return hashlib.md5(
+            f'{moment.isoformat()}|{versions}|{_visitor(request)}'.encode()
+        ).hexdigest()
+
+    def last_modified(request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return None
+        return last_change(request, **kwargs)
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
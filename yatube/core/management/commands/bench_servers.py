@@ -0,0 +1,153 @@
+import asyncio
+import io
+import statistics
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.core.wsgi import get_wsgi_application
+
+from core.asgi import WsgiToAsgi, environ
+
+
+def _scope(path):
+    path, _, query = path.partition('?')
+    return {
+        'type': 'http',
+        'method': 'GET',
+        'path': path,
+        'query_string': query.encode(),
+        'headers': [(b'host', b'localhost')],
+    }
+
+
+def _percentile(values, share):
+    return values[min(int(len(values) * share), len(values) - 1)]
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пропускную способность WSGI и ASGI при множестве '
+        'одновременных медленных клиентов. Клиенты выполняются в этом же '
+        'процессе; WSGI-воркер ждёт медленного клиента, ASGI — нет.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/', help='Адрес страницы.')
+        parser.add_argument(
+            '--requests', type=int, default=1000,
+            help='Сколько запросов выполнить в каждом режиме.'
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=200,
+            help='Число одновременных клиентов.'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=16,
+            help='Потоков с Django: WSGI-воркеров и пула ASGI.'
+        )
+        parser.add_argument(
+            '--client-delay', type=float, default=0.05,
+            help='Сколько секунд клиент передаёт запрос.'
+        )
+
+    def wsgi(self, app, options):
+        """Синхронные воркеры: поток занят, пока клиент передаёт запрос."""
+        workers = threading.Semaphore(options['workers'])
+        latencies = []
+        errors = []
+
+        def start_response(status, headers, exc_info=None):
+            if not status.startswith('200'):
+                errors.append(status)
+
+        def client(count):
+            for _ in range(count):
+                started = time.perf_counter()
+                with workers:
+                    time.sleep(options['client_delay'])
+                    result = app(
+                        environ(_scope(options['path']), io.BytesIO()),
+                        start_response
+                    )
+                    b''.join(result)
+                    result.close()
+                latencies.append(time.perf_counter() - started)
+
+        threads = [
+            threading.Thread(target=client, args=(count,))
+            for count in self.split(options)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return latencies, errors
+
+    def asgi(self, app, options):
+        """ASGI: запрос передаётся в цикле событий, поток не занят."""
+        application = WsgiToAsgi(app, max_workers=options['workers'])
+        latencies = []
+        errors = []
+
+        async def receive():
+            await asyncio.sleep(options['client_delay'])
+            return {'type': 'http.request', 'body': b''}
+
+        async def send(message):
+            if message['type'] == 'http.response.start' and (
+                message['status'] != 200
+            ):
+                errors.append(message['status'])
+
+        async def client(count):
+            for _ in range(count):
+                started = time.perf_counter()
+                await application(_scope(options['path']), receive, send)
+                latencies.append(time.perf_counter() - started)
+
+        async def main():
+            await asyncio.gather(
+                *(client(count) for count in self.split(options))
+            )
+
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(main())
+        finally:
+            loop.close()
+            application.pool.shutdown()
+        return latencies, errors
+
+    def split(self, options):
+        """Число запросов каждого клиента."""
+        total, clients = options['requests'], options['concurrency']
+        return [
+            total // clients + (1 if number < total % clients else 0)
+            for number in range(clients)
+        ]
+
+    def report(self, mode, elapsed, latencies, errors):
+        latencies.sort()
+        self.stdout.write(
+            '{}: {:.0f} запросов/с, p50 {:.0f} мс, p95 {:.0f} мс, '
+            'p99 {:.0f} мс, среднее {:.0f} мс, ошибок {}'.format(
+                mode, len(latencies) / elapsed,
+                _percentile(latencies, 0.5) * 1000,
+                _percentile(latencies, 0.95) * 1000,
+                _percentile(latencies, 0.99) * 1000,
+                statistics.mean(latencies) * 1000,
+                len(errors),
+            )
+        )
+
+    def handle(self, *args, **options):
+        app = get_wsgi_application()
+        # Прогрев: кэш страниц и шаблонов заполняется до замеров.
+        self.wsgi(app, dict(options, requests=1, concurrency=1))
+        for mode in ('WSGI', 'ASGI'):
+            started = time.perf_counter()
+            latencies, errors = getattr(self, mode.lower())(app, options)
+            self.report(
+                mode, time.perf_counter() - started, latencies, errors
+            )
@@ -0,0 +1,145 @@
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, close_old_connections, connections
+from django.test.utils import override_settings
+
+from posts.consts import POSTS_IN_PAGE
+from posts.models import Comment, Post, User
+
+from .bench_servers import _percentile
+
+ALIAS = 'bench'
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает смешанную нагрузку чтения и записи на копии базы: '
+        'SQLite по умолчанию и с прагмами SQLITE_PRAGMAS и CONN_MAX_AGE.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests', type=int, default=2000,
+            help='Сколько запросов выполнить в каждом режиме.'
+        )
+        parser.add_argument(
+            '--threads', type=int, default=8,
+            help='Число одновременных потоков-воркеров.'
+        )
+        parser.add_argument(
+            '--writes', type=float, default=0.1,
+            help='Доля запросов, добавляющих комментарий.'
+        )
+
+    def copy(self, directory, journal_mode):
+        """Копия базы проекта с заданным режимом журнала."""
+        path = os.path.join(directory, f'{journal_mode}.sqlite3')
+        source = sqlite3.connect(settings.DATABASES['default']['NAME'])
+        target = sqlite3.connect(path)
+        try:
+            source.backup(target)
+            target.execute(f'PRAGMA journal_mode = {journal_mode}')
+        finally:
+            source.close()
+            target.close()
+        return path
+
+    def request(self, write, post_ids, user_ids):
+        """Один «запрос»: страница главной или новый комментарий."""
+        if write:
+            Comment.objects.using(ALIAS).bulk_create([Comment(
+                post_id=random.choice(post_ids),
+                author_id=random.choice(user_ids),
+                text='Проверка нагрузки',
+            )])
+        else:
+            list(Post.objects.using(ALIAS).select_related(
+                'author', 'group'
+            ).order_by('-pub_date')[:POSTS_IN_PAGE])
+
+    def run(self, options):
+        post_ids = list(
+            Post.objects.using(ALIAS).values_list('pk', flat=True)[:100]
+        )
+        user_ids = list(
+            User.objects.using(ALIAS).values_list('pk', flat=True)[:100]
+        )
+        latencies = []
+        errors = []
+
+        def worker(count):
+            for _ in range(count):
+                started = time.perf_counter()
+                try:
+                    self.request(
+                        random.random() < options['writes'],
+                        post_ids, user_ids
+                    )
+                except OperationalError as error:
+                    errors.append(error)
+                # Конец запроса: соединение закрывается по CONN_MAX_AGE.
+                close_old_connections()
+                latencies.append(time.perf_counter() - started)
+            connections[ALIAS].close()
+
+        total, threads = options['requests'], options['threads']
+        workers = [
+            threading.Thread(target=worker, args=(
+                total // threads + (1 if number < total % threads else 0),
+            ))
+            for number in range(threads)
+        ]
+        started = time.perf_counter()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        return time.perf_counter() - started, latencies, errors
+
+    def measure(self, mode, path, max_age, pragmas, options):
+        connections.databases[ALIAS] = dict(
+            settings.DATABASES['default'], NAME=path, CONN_MAX_AGE=max_age
+        )
+        try:
+            with override_settings(SQLITE_PRAGMAS=pragmas):
+                elapsed, latencies, errors = self.run(options)
+        finally:
+            connections[ALIAS].close()
+            del connections.databases[ALIAS]
+            # Обёртка соединения создаётся заново под следующий режим.
+            if hasattr(connections._connections, ALIAS):
+                delattr(connections._connections, ALIAS)
+        latencies.sort()
+        self.stdout.write(
+            '{}: {:.0f} запросов/с, p50 {:.1f} мс, p99 {:.1f} мс, '
+            'среднее {:.1f} мс, ошибок {}'.format(
+                mode, len(latencies) / elapsed,
+                _percentile(latencies, 0.5) * 1000,
+                _percentile(latencies, 0.99) * 1000,
+                statistics.mean(latencies) * 1000,
+                len(errors),
+            )
+        )
+
+    def handle(self, *args, **options):
+        directory = tempfile.mkdtemp()
+        try:
+            self.measure(
+                'По умолчанию', self.copy(directory, 'delete'), 0, {}, options
+            )
+            self.measure(
+                'С настройкой', self.copy(directory, 'wal'),
+                settings.DATABASES['default']['CONN_MAX_AGE'],
+                settings.SQLITE_PRAGMAS, options
+            )
+        finally:
+            shutil.rmtree(directory)
@@ -0,0 +1,55 @@
+import os
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        'Копирует основную базу SQLite в файлы реплик из DATABASE_REPLICAS '
+        'через backup API: читатели реплик видят либо старую, либо новую '
+        'копию целиком. Заменяет настоящую репликацию при локальной '
+        'проверке.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float, default=0,
+            help='Повторять раз в столько секунд; 0 — скопировать один раз.'
+        )
+
+    def copy(self, source, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        target = sqlite3.connect(path, timeout=30)
+        try:
+            source.backup(target)
+        finally:
+            target.close()
+
+    def replicate(self):
+        started = time.perf_counter()
+        # NAME может быть и URI, как у базы в памяти при тестах.
+        source = sqlite3.connect(
+            settings.DATABASES['default']['NAME'], uri=True
+        )
+        try:
+            for path in settings.DATABASE_REPLICAS:
+                self.copy(source, path)
+        finally:
+            source.close()
+        self.stdout.write('Реплики обновлены за {:.0f} мс'.format(
+            (time.perf_counter() - started) * 1000
+        ))
+
+    def handle(self, *args, **options):
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError('Реплики не заданы: DATABASE_REPLICAS пуст')
+        while True:
+            self.replicate()
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
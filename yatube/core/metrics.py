@@ -0,0 +1,317 @@
+"""Метрики запросов в формате Prometheus.
+
+MetricsMiddleware считает по имени маршрута (`posts:index`, ...)
+число ответов по кодам, гистограммы времени ответа и размера ответа,
+запросы к БД и обращения к кэшу. Замеры пишутся в словарь текущего
+потока без блокировок; раз в METRICS_FLUSH_INTERVAL секунд один из
+потоков сливает словари всех потоков процесса в файл `<pid>.json`
+в METRICS_DIR. Представление `metrics` складывает файлы всех рабочих
+процессов, а без METRICS_DIR отдаёт только метрики своего процесса.
+Файлы завершившихся процессов при этом переносятся в RETIRED_FILE,
+чтобы каталог не рос, а счётчики не уменьшались.
+"""
+import atexit
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse, HttpResponseForbidden
+
+from . import timing
+from .writes import host_lock
+
+PREFIX = 'yatube'
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+UNMATCHED = '<unmatched>'
+RETIRED_FILE = 'retired.json'
+LOCK_FILE = 'gather.lock'
+DURATION_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10
+)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576)
+HISTOGRAMS = {
+    'request_duration_seconds': (
+        DURATION_BUCKETS, 'Время ответа, секунды.'
+    ),
+    'response_size_bytes': (SIZE_BUCKETS, 'Размер тела ответа, байты.'),
+}
+COUNTERS = {
+    'requests_total': 'Число ответов по кодам.',
+    'db_queries_total': 'Число запросов к БД.',
+    'db_seconds_total': 'Время запросов к БД, секунды.',
+    'cache_hits_total': 'Попадания в кэш.',
+    'cache_misses_total': 'Промахи кэша.',
+    'thumbnail_lookups_total': 'Миниатюры, найденные пакетным поиском.',
+    'thumbnail_misses_total': 'Миниатюры, которых ещё нет.',
+    'thumbnail_saved_lookups_total': (
+        'Обращения к хранилищу миниатюр, сэкономленные пакетным поиском.'
+    ),
+}
+# Счётчики Timings, которые выгружаются как есть.
+TIMING_COUNTERS = (
+    'thumbnail_lookups', 'thumbnail_misses', 'thumbnail_saved_lookups'
+)
+
+_local = threading.local()
+# Словари всех потоков процесса. Пишет в словарь только его поток,
+# остальные лишь копируют его при слиянии.
+_stores = []
+_stores_lock = threading.Lock()
+_flush_lock = threading.Lock()
+_flushed = time.monotonic()
+
+
+def _store():
+    store = getattr(_local, 'store', None)
+    if store is None:
+        _local.store = store = Counter()
+        with _stores_lock:
+            _stores.append(store)
+    return store
+
+
+def _observe(store, name, view, value, buckets):
+    for bound in buckets:
+        if value <= bound:
+            store[(name + '_bucket', view, str(bound))] += 1
+            break
+    else:
+        store[(name + '_bucket', view, '+Inf')] += 1
+    store[(name + '_sum', view)] += value
+    store[(name + '_count', view)] += 1
+
+
+def record(view, status, duration, size, timings):
+    """Учитывает один ответ представления `view`."""
+    store = _store()
+    store[('requests_total', view, str(status))] += 1
+    _observe(
+        store, 'request_duration_seconds', view, duration, DURATION_BUCKETS
+    )
+    if size is not None:
+        _observe(store, 'response_size_bytes', view, size, SIZE_BUCKETS)
+    store[('db_queries_total', view)] += timings.counts['db']
+    store[('db_seconds_total', view)] += timings.durations['db']
+    store[('cache_hits_total', view)] += timings.counts['cache_hits']
+    store[('cache_misses_total', view)] += timings.counts['cache_misses']
+    for name in TIMING_COUNTERS:
+        store[(name + '_total', view)] += timings.counts[name]
+
+
+def snapshot():
+    """Сумма замеров всех потоков процесса."""
+    total = Counter()
+    with _stores_lock:
+        stores = list(_stores)
+    for store in stores:
+        # Копия словаря с ключами-кортежами строк делается под GIL
+        # за один шаг, поэтому пишущий поток ей не мешает.
+        total.update(dict(store))
+    return total
+
+
+def _path(pid):
+    return os.path.join(settings.METRICS_DIR, f'{pid}.json')
+
+
+def _write(path, samples):
+    """Атомарно заменяет файл замеров."""
+    data = json.dumps([[list(key), value] for key, value in samples.items()])
+    descriptor, temporary = tempfile.mkstemp(
+        dir=os.path.dirname(path), suffix='.tmp'
+    )
+    with os.fdopen(descriptor, 'w') as file:
+        file.write(data)
+    os.replace(temporary, path)
+
+
+def _read(path):
+    try:
+        with open(path) as file:
+            rows = json.load(file)
+    except (OSError, ValueError):
+        return None
+    return Counter({tuple(key): value for key, value in rows})
+
+
+def flush():
+    """Записывает замеры процесса в его файл в METRICS_DIR."""
+    global _flushed
+    directory = settings.METRICS_DIR
+    if not directory:
+        return
+    os.makedirs(directory, exist_ok=True)
+    _write(_path(os.getpid()), snapshot())
+    _flushed = time.monotonic()
+
+
+def maybe_flush():
+    if time.monotonic() - _flushed < settings.METRICS_FLUSH_INTERVAL:
+        return
+    # Сливает один поток; остальные не ждут его.
+    if _flush_lock.acquire(blocking=False):
+        try:
+            flush()
+        finally:
+            _flush_lock.release()
+
+
+def _alive(pid):
+    if os.name != 'posix':
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def retire_dead(paths):
+    """Переносит замеры завершившихся процессов в RETIRED_FILE.
+
+    Возвращает оставшиеся файлы. Вызывается под блокировкой LOCK_FILE.
+    """
+    dead = []
+    for path in paths:
+        name = os.path.splitext(os.path.basename(path))[0]
+        if name.isdigit() and not _alive(int(name)):
+            dead.append(path)
+    if not dead:
+        return paths
+    retired_path = os.path.join(settings.METRICS_DIR, RETIRED_FILE)
+    retired = _read(retired_path) or Counter()
+    for path in dead:
+        retired.update(_read(path) or {})
+    _write(retired_path, retired)
+    for path in dead:
+        os.remove(path)
+    return [path for path in paths if path not in dead] + [retired_path]
+
+
+def gather():
+    """Сумма замеров всех рабочих процессов."""
+    directory = settings.METRICS_DIR
+    if not directory:
+        return snapshot()
+    flush()
+    total = Counter()
+    with host_lock(os.path.join(directory, LOCK_FILE)):
+        paths = retire_dead(glob.glob(os.path.join(directory, '*.json')))
+        for path in set(paths):
+            total.update(_read(path) or {})
+    return total
+
+
+def _labels(view, **extra):
+    labels = dict(view=view, **extra)
+    return '{' + ','.join(
+        '{}="{}"'.format(
+            name, value.replace('\\', r'\\').replace('"', r'\"')
+        )
+        for name, value in labels.items()
+    ) + '}'
+
+
+def _histogram(samples, views, name, buckets):
+    for view in views:
+        if not samples[(name + '_count', view)]:
+            continue
+        cumulative = 0
+        for bound in [str(bound) for bound in buckets] + ['+Inf']:
+            cumulative += samples[(name + '_bucket', view, bound)]
+            yield '{}_{}_bucket{} {}'.format(
+                PREFIX, name, _labels(view, le=bound), cumulative
+            )
+        for suffix in ('_sum', '_count'):
+            yield '{}_{}{}{} {}'.format(
+                PREFIX, name, suffix, _labels(view),
+                samples[(name + suffix, view)]
+            )
+
+
+def _counter(samples, name):
+    for key, value in sorted(samples.items()):
+        if key[0] == name:
+            extra = {'status': key[2]} if len(key) > 2 else {}
+            yield '{}_{}{} {}'.format(
+                PREFIX, name, _labels(key[1], **extra), value
+            )
+
+
+def _hit_ratio(samples, views):
+    for view in views:
+        hits = samples[('cache_hits_total', view)]
+        lookups = hits + samples[('cache_misses_total', view)]
+        if lookups:
+            yield '{}_cache_hit_ratio{} {:.4f}'.format(
+                PREFIX, _labels(view), hits / lookups
+            )
+
+
+def _family(name, kind, description, samples):
+    return [
+        f'# HELP {PREFIX}_{name} {description}',
+        f'# TYPE {PREFIX}_{name} {kind}',
+        *samples,
+    ]
+
+
+def exposition(samples):
+    """Текст метрик в формате Prometheus."""
+    views = sorted({key[1] for key in samples})
+    lines = []
+    for name, (buckets, description) in HISTOGRAMS.items():
+        lines += _family(
+            name, 'histogram', description,
+            _histogram(samples, views, name, buckets)
+        )
+    for name, description in COUNTERS.items():
+        lines += _family(
+            name, 'counter', description, _counter(samples, name)
+        )
+    lines += _family(
+        'cache_hit_ratio', 'gauge', 'Доля попаданий в кэш.',
+        _hit_ratio(samples, views)
+    )
+    return '\n'.join(lines) + '\n'
+
+
+def metrics(request):
+    """Метрики для сборщика с INTERNAL_IPS или для сотрудника."""
+    if request.META.get('REMOTE_ADDR') not in settings.INTERNAL_IPS and (
+        not request.user.is_staff
+    ):
+        return HttpResponseForbidden()
+    return HttpResponse(exposition(gather()), content_type=CONTENT_TYPE)
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        if not settings.METRICS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if settings.METRICS_DIR:
+            atexit.register(flush)
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        with timing.collect() as timings:
+            response = self.get_response(request)
+        match = getattr(request, 'resolver_match', None)
+        record(
+            match.view_name if match else UNMATCHED,
+            response.status_code,
+            time.perf_counter() - started,
+            None if response.streaming else len(response.content),
+            timings,
+        )
+        maybe_flush()
+        return response
@@ -0,0 +1,126 @@
+"""Поиск N+1 запросов к БД во время работы сайта.
+
+Для выбранной доли запросов (NPLUSONE_SAMPLE_RATE) middleware
+записывает все SQL-запросы, группирует их по форме (тексту без
+значений) и сообщает о формах, повторившихся не меньше
+NPLUSONE_THRESHOLD раз. Для каждой формы указывается место, откуда
+запросы шли чаще всего: строка шаблона, если запрос вызван при
+отрисовке, иначе строка кода проекта. Сводка пишется в лог и в
+заголовок ответа X-NPlusOne.
+
+При NPLUSONE_SAMPLE_RATE = 0 middleware не подключается вовсе.
+"""
+import logging
+import os
+import random
+import re
+import sys
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from .queries import execute_wrapper
+
+logger = logging.getLogger(__name__)
+
+HEADER = 'X-NPlusOne'
+PARAMETER_LIST = re.compile(r'\((?:\s*%s\s*,)+\s*%s\s*\)')
+LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+# Кадры этих каталогов не считаются местом вызова запроса.
+LIBRARY_PATHS = tuple(
+    os.path.dirname(module.__file__) + os.sep
+    for module in (sys.modules['django'], os)
+)
+
+
+def query_shape(sql):
+    """Текст запроса без значений: одинаков для всех итераций цикла."""
+    sql = PARAMETER_LIST.sub('(...)', sql)
+    return LITERAL.sub('?', sql)
+
+
+def _template_location(frame):
+    """Строка шаблона, которая сейчас отрисовывается, если такая есть."""
+    while frame is not None:
+        if frame.f_code.co_name == 'render_annotated':
+            node = frame.f_locals.get('self')
+            token = getattr(node, 'token', None)
+            origin = getattr(node, 'origin', None)
+            if token is not None and origin is not None:
+                name = origin.template_name or origin.name
+                return f'{name}:{token.lineno}'
+        frame = frame.f_back
+    return None
+
+
+def _code_location(frame):
+    """Ближайшая к запросу строка кода проекта."""
+    here = os.path.abspath(__file__)
+    while frame is not None:
+        path = os.path.abspath(frame.f_code.co_filename)
+        if path != here and not path.startswith(LIBRARY_PATHS) and (
+            'site-packages' not in path
+        ):
+            relative = os.path.relpath(path, settings.BASE_DIR)
+            return f'{relative}:{frame.f_lineno}'
+        frame = frame.f_back
+    return None
+
+
+class QueryRecorder:
+    """Обёртка выполнения запросов, которая запоминает их форму и место."""
+
+    def __init__(self):
+        self.count = 0
+        self.shapes = Counter()
+        self.locations = defaultdict(Counter)
+
+    def __call__(self, execute, sql, params, many, context):
+        frame = sys._getframe(1)
+        shape = query_shape(sql)
+        self.count += 1
+        self.shapes[shape] += 1
+        self.locations[shape][
+            _template_location(frame) or _code_location(frame) or '?'
+        ] += 1
+        return execute(sql, params, many, context)
+
+    def suspects(self, threshold):
+        """[(число повторов, форма, место)] по убыванию повторов."""
+        return [
+            (count, shape, self.locations[shape].most_common(1)[0][0])
+            for shape, count in self.shapes.most_common()
+            if count >= threshold
+        ]
+
+
+class NPlusOneMiddleware:
+    def __init__(self, get_response):
+        if not settings.NPLUSONE_SAMPLE_RATE:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = settings.NPLUSONE_SAMPLE_RATE
+        self.threshold = settings.NPLUSONE_THRESHOLD
+
+    def __call__(self, request):
+        if random.random() >= self.sample_rate:
+            return self.get_response(request)
+        recorder = QueryRecorder()
+        with execute_wrapper(recorder):
+            response = self.get_response(request)
+        suspects = recorder.suspects(self.threshold)
+        if not suspects:
+            return response
+        logger.warning(
+            'Похоже на N+1: %s %s, всего запросов %d\n%s',
+            request.method, request.path, recorder.count,
+            '\n'.join(
+                f'  {count} раз из {location}: {shape}'
+                for count, shape, location in suspects
+            )
+        )
+        response[HEADER] = '; '.join(
+            f'{count}x {location}' for count, shape, location in suspects
+        ).encode('ascii', 'replace').decode()
+        return response
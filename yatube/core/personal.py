@@ -0,0 +1,69 @@
+"""Личные части страниц, которые не попадают в общий кэш.
+
+Шапка, кнопка подписки, форма комментария и прочие куски, зависящие
+от посетителя, объявляются фрагментами: шаблон и функция, которая
+строит его контекст по запросу и строковым параметрам. В шаблоне
+страницы фрагмент вставляется тегом `{% personal 'имя' параметр=... %}`.
+
+Обычно тег сразу отрисовывает фрагмент. Если страница отрисовывается
+для общего кэша (`start(request)`), тег оставляет на его месте
+метку-комментарий, а `fill(request, content)` заменяет метки
+фрагментами, отрисованными для текущего посетителя.
+"""
+import re
+from urllib.parse import parse_qsl, urlencode
+
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+MARKER = '<!--personal:{name}?{params}-->'
+MARKER_PATTERN = re.compile(rb'<!--personal:([\w-]+)\?([^>]*?)-->')
+
+_fragments = {}
+
+
+def fragment(name, template):
+    """Регистрирует функцию контекста фрагмента `name`."""
+    def decorator(get_context):
+        _fragments[name] = (template, get_context)
+        return get_context
+    return decorator
+
+
+def render(request, name, params):
+    template, get_context = _fragments[name]
+    return render_to_string(
+        template, get_context(request, **params), request=request
+    )
+
+
+def start(request):
+    """Дальше страница отрисовывается с метками вместо фрагментов."""
+    request.personal_markers = True
+
+
+def place(request, name, params):
+    """Фрагмент или метка на его месте, если страница пойдёт в кэш."""
+    if not getattr(request, 'personal_markers', False):
+        return render(request, name, params)
+    return mark_safe(MARKER.format(name=name, params=urlencode(params)))
+
+
+def fill(request, content):
+    """Заменяет метки в байтах страницы фрагментами для посетителя."""
+    rendered = {}
+
+    def replace(match):
+        if match.group(0) not in rendered:
+            name, params = match.group(1, 2)
+            rendered[match.group(0)] = render(
+                request, name.decode(), dict(parse_qsl(params.decode()))
+            ).encode()
+        return rendered[match.group(0)]
+
+    return MARKER_PATTERN.sub(replace, content)
+
+
+@fragment('header', 'includes/header.html')
+def header(request):
+    return {}
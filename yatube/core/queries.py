@@ -0,0 +1,64 @@
+"""Бюджет запросов к БД, объявленный у представления.
+
+Бюджет — наибольшее число запросов, которое представление может сделать
+за один вызов, независимо от размера страницы. В тестах превышение
+(QUERY_BUDGET_STRICT = True) вызывает исключение, в работе — пишется
+в лог.
+"""
+import logging
+from contextlib import ExitStack, contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+@contextmanager
+def execute_wrapper(wrapper):
+    """Ставит обёртку выполнения запросов на соединения всех баз.
+
+    Чтения могут идти в реплики (см. core.replicas), поэтому обёртки
+    только основного соединения было бы мало.
+    """
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(wrapper))
+        yield
+
+
+class QueryCounter:
+    """Обёртка выполнения запросов, которая их считает."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def query_budget(limit):
+    """Ограничивает число запросов к БД при вызове представления."""
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            counter = QueryCounter()
+            with execute_wrapper(counter):
+                response = view_func(request, *args, **kwargs)
+            if counter.count > limit:
+                message = '{} {}: {} запросов к БД при бюджете {}'.format(
+                    request.method, request.path, counter.count, limit
+                )
+                if settings.QUERY_BUDGET_STRICT:
+                    raise QueryBudgetExceeded(message)
+                logger.warning(message)
+            return response
+        wrapper.query_budget = limit
+        return wrapper
+    return decorator
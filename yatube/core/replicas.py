@@ -0,0 +1,120 @@
+"""Чтение с реплик базы для страниц, которые ничего не пишут.
+
+Реплики перечислены в DATABASE_REPLICAS и доступны под псевдонимами
+replica_0, replica_1, ... Представление с декоратором `read_only`
+читает со случайной живой реплики; все записи идут в основную базу.
+Записавшему посетителю ставится кука REPLICA_PIN_COOKIE: пока она
+жива, его страницы читаются из основной базы, и он сразу видит свой
+пост, комментарий или подписку, даже если реплика отстаёт. Реплика,
+на которой запрос упал с ошибкой БД, исключается на
+REPLICA_RETRY_SECONDS, а страница собирается заново из основной базы.
+
+Всё, что сохраняется в общий кэш (страницы, ленты, объекты), читается
+из основной базы внутри `primary()`: иначе отставшая реплика надолго
+оставила бы в кэше старые данные.
+"""
+import random
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+REPLICA_ALIAS = 'replica_{}'
+SAFE_METHODS = ('GET', 'HEAD')
+
+_state = threading.local()
+# {псевдоним: до какого момента time.monotonic() реплика исключена}.
+_down = {}
+
+
+def aliases():
+    return [
+        REPLICA_ALIAS.format(number)
+        for number in range(len(settings.DATABASE_REPLICAS))
+    ]
+
+
+def wrote():
+    """Отмечает, что текущий запрос записал в основную базу."""
+    _state.wrote = True
+
+
+@contextmanager
+def reading(alias):
+    """Чтения моделей внутри блока идут в базу `alias`."""
+    previous = getattr(_state, 'alias', None)
+    _state.alias = alias
+    try:
+        yield
+    finally:
+        _state.alias = previous
+
+
+def primary():
+    """Чтения внутри блока идут в основную базу."""
+    return reading(DEFAULT_DB_ALIAS)
+
+
+def choose(request):
+    """Живая реплика для запроса или None, если читать из основной."""
+    if request.method not in SAFE_METHODS:
+        return None
+    if settings.REPLICA_PIN_COOKIE in request.COOKIES:
+        return None
+    now = time.monotonic()
+    alive = [alias for alias in aliases() if _down.get(alias, 0) <= now]
+    return random.choice(alive) if alive else None
+
+
+def read_only(view):
+    """Представление читает с реплики; при ошибке — из основной базы."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        alias = choose(request)
+        if alias is None:
+            return view(request, *args, **kwargs)
+        try:
+            with reading(alias):
+                return view(request, *args, **kwargs)
+        except DatabaseError:
+            _down[alias] = time.monotonic() + settings.REPLICA_RETRY_SECONDS
+            connections[alias].close()
+            return view(request, *args, **kwargs)
+    return wrapper
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return getattr(_state, 'alias', None)
+
+    def db_for_write(self, model, **hints):
+        wrote()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики хранят те же строки, что и основная база.
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaMiddleware:
+    """Ставит куку REPLICA_PIN_COOKIE посетителю, который что-то записал."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        _state.wrote = False
+        response = self.get_response(request)
+        if _state.wrote and settings.DATABASE_REPLICAS:
+            response.set_cookie(
+                settings.REPLICA_PIN_COOKIE, '1',
+                max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True, samesite='Lax'
+            )
+        return response
@@ -0,0 +1,42 @@
+"""Настройка соединений Django с SQLite.
+
+Каждое новое соединение получает прагмы из SQLITE_PRAGMAS: журнал WAL
+позволяет читать во время записи, synchronous=NORMAL в WAL не теряет
+целостность при сбое процесса, mmap_size и cache_size держат горячие
+страницы в памяти, а busy_timeout заставляет писателей ждать
+блокировку вместо немедленной ошибки «database is locked». Вместе
+с CONN_MAX_AGE соединение и его кэш страниц живут дольше запроса.
+"""
+import re
+
+from django.conf import settings
+
+# Имена и значения прагм подставляются в SQL, поэтому проверяются.
+PRAGMA_NAME = re.compile(r'^[a-z_]+$')
+PRAGMA_VALUE = re.compile(r'^-?\w+$')
+# Режим журнала записывается в файл базы: соединение только для чтения
+# (реплика, см. core.replicas) его не меняет, а получает от копии.
+READ_ONLY_SKIPPED = ('journal_mode',)
+
+
+def pragmas(read_only=False):
+    """Список выражений PRAGMA из настройки SQLITE_PRAGMAS."""
+    statements = []
+    for name, value in getattr(settings, 'SQLITE_PRAGMAS', {}).items():
+        if read_only and name in READ_ONLY_SKIPPED:
+            continue
+        value = str(value)
+        if not PRAGMA_NAME.match(name) or not PRAGMA_VALUE.match(value):
+            raise ValueError(f'Недопустимая прагма SQLite: {name}={value}')
+        statements.append(f'PRAGMA {name} = {value}')
+    return statements
+
+
+def configure(sender, connection, **kwargs):
+    """Обработчик connection_created: прагмы для соединений SQLite."""
+    if connection.vendor != 'sqlite':
+        return
+    read_only = 'mode=ro' in str(connection.settings_dict['NAME'])
+    with connection.cursor() as cursor:
+        for statement in pragmas(read_only):
+            cursor.execute(statement)
@@ -0,0 +1,309 @@
+"""Кэш, общий для всех процессов-воркеров на одном хосте.
+
+Записи лежат в файле SQLite в режиме WAL и читаются через mmap, поэтому
+воркеры видят один и тот же кэш без отдельного сервиса. Объём кэша
+ограничен в байтах; при переполнении вытесняются записи, к которым
+дольше всего не обращались.
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from . import timing
+
+# Параметров в одном запросе SQLite не может быть больше 999.
+CHUNK_SIZE = 900
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache ('
+    ' key TEXT PRIMARY KEY,'
+    ' value BLOB NOT NULL,'
+    ' expires REAL,'
+    ' size INTEGER NOT NULL,'
+    ' accessed REAL NOT NULL'
+    ') WITHOUT ROWID',
+    'CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)',
+    'CREATE TABLE IF NOT EXISTS stats ('
+    ' name TEXT PRIMARY KEY,'
+    ' value INTEGER NOT NULL'
+    ') WITHOUT ROWID',
+)
+STATS = ('bytes', 'hits', 'misses', 'evictions')
+
+
+def _chunks(items):
+    for start in range(0, len(items), CHUNK_SIZE):
+        yield items[start:start + CHUNK_SIZE]
+
+
+class SQLiteCache(BaseCache):
+    """Бэкенд кэша Django поверх файла SQLite.
+
+    Параметры OPTIONS:
+    MAX_BYTES — предельный объём значений в байтах;
+    MMAP_SIZE — сколько байт файла отображать в память;
+    TOUCH_INTERVAL — не чаще какого интервала (в секундах) обновлять
+    время обращения к записи при чтении.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._path = location
+        self._max_bytes = int(options.get('MAX_BYTES', 64 * 1024 * 1024))
+        self._mmap_size = int(options.get('MMAP_SIZE', self._max_bytes))
+        self._touch_interval = float(options.get('TOUCH_INTERVAL', 60))
+        self._local = threading.local()
+        # Попадания и промахи копятся в памяти процесса и записываются
+        # в файл вместе с ближайшей записью, чтобы чтение не писало.
+        self._pending = Counter()
+        self._pending_lock = threading.Lock()
+
+    @property
+    def _db(self):
+        # Соединение своё у каждого потока и у каждого процесса после fork.
+        db = getattr(self._local, 'db', None)
+        if db is None or self._local.pid != os.getpid():
+            directory = os.path.dirname(self._path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            db = sqlite3.connect(self._path, timeout=30, isolation_level=None)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            db.execute(f'PRAGMA mmap_size={self._mmap_size}')
+            for statement in SCHEMA:
+                db.execute(statement)
+            self._local.db, self._local.pid = db, os.getpid()
+        return db
+
+    @contextmanager
+    def _write(self):
+        with timing.timer('cache'):
+            db = self._db
+            db.execute('BEGIN IMMEDIATE')
+            try:
+                yield db
+                self._flush_stats(db)
+            except BaseException:
+                db.execute('ROLLBACK')
+                raise
+            db.execute('COMMIT')
+
+    def _count(self, name, value=1):
+        with self._pending_lock:
+            self._pending[name] += value
+
+    def _flush_stats(self, db):
+        with self._pending_lock:
+            pending, self._pending = self._pending, Counter()
+        for name, value in pending.items():
+            if value:
+                self._add_stat(db, name, value)
+
+    def _add_stat(self, db, name, value):
+        db.execute(
+            'INSERT INTO stats (name, value) VALUES (?, ?) '
+            'ON CONFLICT (name) DO UPDATE SET value = value + excluded.value',
+            (name, value)
+        )
+
+    @timing.timer('cache')
+    def _read(self, keys):
+        """Живые записи по ключам кэша: {ключ: (значение, обращение)}."""
+        now = time.time()
+        found = {}
+        for chunk in _chunks(keys):
+            rows = self._db.execute(
+                'SELECT key, value, expires, accessed FROM cache '
+                f'WHERE key IN ({", ".join("?" * len(chunk))})',
+                chunk
+            )
+            for key, value, expires, accessed in rows:
+                if expires is None or expires > now:
+                    found[key] = (value, accessed)
+        stale = [
+            key for key, (value, accessed) in found.items()
+            if now - accessed > self._touch_interval
+        ]
+        if stale:
+            with self._write() as db:
+                db.executemany(
+                    'UPDATE cache SET accessed = ? WHERE key = ?',
+                    [(now, key) for key in stale]
+                )
+        self._count('hits', len(found))
+        self._count('misses', len(keys) - len(found))
+        timing.count('cache_hits', len(found))
+        timing.count('cache_misses', len(keys) - len(found))
+        return {key: value for key, (value, accessed) in found.items()}
+
+    def _store(self, db, key, value, timeout):
+        value = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        size = len(key) + len(value)
+        self._drop(db, [key])
+        db.execute(
+            'INSERT INTO cache (key, value, expires, size, accessed) '
+            'VALUES (?, ?, ?, ?, ?)',
+            (key, value, self.get_backend_timeout(timeout), size, time.time())
+        )
+        self._add_stat(db, 'bytes', size)
+
+    def _drop(self, db, keys):
+        """Удаляет записи и возвращает число удалённых."""
+        deleted = 0
+        for chunk in _chunks(keys):
+            placeholders = ', '.join('?' * len(chunk))
+            row = db.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache '
+                f'WHERE key IN ({placeholders})',
+                chunk
+            ).fetchone()
+            if row[0]:
+                db.execute(
+                    f'DELETE FROM cache WHERE key IN ({placeholders})', chunk
+                )
+                self._add_stat(db, 'bytes', -row[1])
+                deleted += row[0]
+        return deleted
+
+    def _evict(self, db):
+        """Вытесняет просроченные, а затем самые давние записи."""
+        used = self._stat(db, 'bytes')
+        if used <= self._max_bytes:
+            return
+        expired = [
+            key for key, in db.execute(
+                'SELECT key FROM cache WHERE expires <= ?', (time.time(),)
+            )
+        ]
+        self._drop(db, expired)
+        used = self._stat(db, 'bytes')
+        evicted = []
+        rows = db.execute('SELECT key, size FROM cache ORDER BY accessed')
+        for key, size in rows:
+            if used <= self._max_bytes:
+                break
+            evicted.append(key)
+            used -= size
+        self._drop(db, evicted)
+        self._add_stat(db, 'evictions', len(evicted))
+
+    def _stat(self, db, name):
+        row = db.execute(
+            'SELECT value FROM stats WHERE name = ?', (name,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        with self._write() as db:
+            row = db.execute(
+                'SELECT expires FROM cache WHERE key = ?', (key,)
+            ).fetchone()
+            if row and (row[0] is None or row[0] > time.time()):
+                return False
+            self._store(db, key, value, timeout)
+            self._evict(db)
+        return True
+
+    def get(self, key, default=None, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        found = self._read([key])
+        if key not in found:
+            return default
+        return pickle.loads(found[key])
+
+    def get_many(self, keys, version=None):
+        made = {self.make_key(key, version=version): key for key in keys}
+        for key in made:
+            self.validate_key(key)
+        found = self._read(list(made))
+        return {made[key]: pickle.loads(value) for key, value in found.items()}
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        with self._write() as db:
+            self._store(db, key, value, timeout)
+            self._evict(db)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        with self._write() as db:
+            for key, value in data.items():
+                key = self.make_key(key, version=version)
+                self.validate_key(key)
+                self._store(db, key, value, timeout)
+            self._evict(db)
+        return []
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        with self._write() as db:
+            cursor = db.execute(
+                'UPDATE cache SET expires = ? '
+                'WHERE key = ? AND (expires IS NULL OR expires > ?)',
+                (self.get_backend_timeout(timeout), key, time.time())
+            )
+        return cursor.rowcount > 0
+
+    def incr(self, key, delta=1, version=None):
+        """Атомарно увеличивает число: запись идёт под блокировкой файла."""
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        with self._write() as db:
+            row = db.execute(
+                'SELECT value, expires FROM cache WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None or row[1] is not None and row[1] <= time.time():
+                raise ValueError("Key '%s' not found" % key)
+            value = pickle.loads(row[0]) + delta
+            db.execute(
+                'UPDATE cache SET value = ?, accessed = ? WHERE key = ?',
+                (pickle.dumps(value, pickle.HIGHEST_PROTOCOL), time.time(),
+                 key)
+            )
+        return value
+
+    def has_key(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        row = self._db.execute(
+            'SELECT expires FROM cache WHERE key = ?', (key,)
+        ).fetchone()
+        return bool(row) and (row[0] is None or row[0] > time.time())
+
+    def delete(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        with self._write() as db:
+            return bool(self._drop(db, [key]))
+
+    def delete_many(self, keys, version=None):
+        keys = [self.make_key(key, version=version) for key in keys]
+        for key in keys:
+            self.validate_key(key)
+        with self._write() as db:
+            self._drop(db, keys)
+
+    def clear(self):
+        with self._write() as db:
+            db.execute('DELETE FROM cache')
+            db.execute("UPDATE stats SET value = 0 WHERE name = 'bytes'")
+
+    def get_stats(self):
+        """Счётчики кэша, общие для всех процессов."""
+        with self._write() as db:
+            stats = dict.fromkeys(STATS, 0)
+            stats.update(db.execute('SELECT name, value FROM stats'))
+            stats['entries'] = db.execute(
+                'SELECT COUNT(*) FROM cache'
+            ).fetchone()[0]
+        return stats
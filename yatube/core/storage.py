@@ -0,0 +1,90 @@
+import hashlib
+import os
+import posixpath
+import re
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+from .writes import host_lock
+
+# Недописанные загрузки; остаются только после падения процесса.
+UPLOAD_PREFIX = 'upload-'
+HASHED_NAME = re.compile(
+    r'(^|/)[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}(\.\w+)?$'
+)
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранилище, где каждый уникальный файл лежит ровно один раз.
+
+    Загрузка пишется во временный файл с подсчётом SHA-256 на лету и
+    переносится в `<папка>/ab/cd/<sha256>.<расширение>`. Одинаковые
+    загрузки получают одно имя, поэтому разделяют и файл, и миниатюры.
+
+    Общий файл удаляется, когда на него не ссылается ни один пост, а
+    ссылка новой загрузки появляется лишь при фиксации её транзакции.
+    Поэтому загрузка обновляет время изменения файла, а файл, изменённый
+    менее IMAGE_RELEASE_GRACE секунд назад, не удаляется (`is_recent`);
+    такие файлы без ссылок, как и файлы откаченных загрузок, убирает
+    команда sweep_images. Создание и удаление файлов идут под
+    блокировкой `lock()`.
+    """
+
+    def lock(self):
+        return host_lock(settings.IMAGE_STORAGE_LOCK)
+
+    def get_available_name(self, name, max_length=None):
+        # Совпадение имён означает совпадение содержимого.
+        return name
+
+    def is_recent(self, name):
+        """Файл мог получить ссылку, которая ещё не зафиксирована."""
+        try:
+            modified = os.path.getmtime(self.path(name))
+        except FileNotFoundError:
+            return False
+        return time.time() - modified < settings.IMAGE_RELEASE_GRACE
+
+    def is_hashed(self, name):
+        """Имя выдано этим хранилищем, а не осталось от старой раскладки."""
+        return bool(name and HASHED_NAME.search(name))
+
+    def _save(self, name, content):
+        directory = posixpath.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        os.makedirs(self.location, exist_ok=True)
+        digest = hashlib.sha256()
+        handle, temporary = tempfile.mkstemp(
+            dir=self.location, prefix=UPLOAD_PREFIX
+        )
+        try:
+            with os.fdopen(handle, 'wb') as file:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    file.write(chunk)
+            hexdigest = digest.hexdigest()
+            name = posixpath.join(
+                directory, hexdigest[:2], hexdigest[2:4], hexdigest + extension
+            )
+            path = self.path(name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if self.file_permissions_mode is not None:
+                os.chmod(temporary, self.file_permissions_mode)
+            with self.lock():
+                if os.path.exists(path):
+                    os.remove(temporary)
+                    os.utime(path)
+                else:
+                    os.replace(temporary, path)
+        except BaseException:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+        return name
@@ -0,0 +1,14 @@
+from django import template
+
+from .. import personal as fragments
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def personal(context, name, **params):
+    """Личный фрагмент `name`, который не кэшируется вместе со страницей."""
+    return fragments.place(
+        context.get('request'), name,
+        {key: str(value) for key, value in params.items()}
+    )
@@ -0,0 +1,66 @@
+import asyncio
+import io
+
+from django.core.wsgi import get_wsgi_application
+from django.test import TestCase
+
+from ..asgi import WsgiToAsgi, environ
+
+
+class WsgiToAsgiTests(TestCase):
+    def test_request_runs_django(self):
+        application = WsgiToAsgi(get_wsgi_application(), max_workers=2)
+        messages = []
+        body = [
+            {'type': 'http.request', 'body': b'', 'more_body': True},
+            {'type': 'http.request', 'body': b''},
+        ]
+
+        async def receive():
+            return body.pop(0)
+
+        async def send(message):
+            messages.append(message)
+
+        scope = {
+            'type': 'http',
+            'method': 'GET',
+            'path': '/about/author/',
+            'query_string': b'',
+            'headers': [(b'host', b'localhost')],
+        }
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(application(scope, receive, send))
+        finally:
+            loop.close()
+            application.pool.shutdown()
+        self.assertEqual(messages[0]['status'], 200)
+        self.assertIn(
+            (b'content-type', b'text/html; charset=utf-8'),
+            messages[0]['headers']
+        )
+        self.assertIn('Об авторе', messages[1]['body'].decode())
+
+    def test_environ_from_scope(self):
+        result = environ({
+            'type': 'http',
+            'method': 'POST',
+            'path': '/app/поиск/',
+            'root_path': '/app',
+            'query_string': b'q=1',
+            'headers': [
+                (b'content-type', b'text/plain'),
+                (b'cookie', b'a=1'),
+                (b'cookie', b'b=2'),
+            ],
+            'client': ('10.0.0.1', 5000),
+        }, io.BytesIO())
+        self.assertEqual(result['SCRIPT_NAME'], '/app')
+        self.assertEqual(
+            result['PATH_INFO'].encode('latin-1').decode(), '/поиск/'
+        )
+        self.assertEqual(result['QUERY_STRING'], 'q=1')
+        self.assertEqual(result['CONTENT_TYPE'], 'text/plain')
+        self.assertEqual(result['HTTP_COOKIE'], 'a=1; b=2')
+        self.assertEqual(result['REMOTE_ADDR'], '10.0.0.1')
@@ -0,0 +1,114 @@
+import threading
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase
+
+from .. import cache as page_cache
+from ..cache import LOCK_KEY, fetch
+
+
+class FetchTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_stale_value_is_served_while_locked(self):
+        self.assertEqual(fetch('key', lambda: 'old', 60, version=1), 'old')
+        cache.add(LOCK_KEY.format('key'), True)
+        compute = mock.Mock(return_value='new')
+        self.assertEqual(fetch('key', compute, 60, version=2), 'old')
+        compute.assert_not_called()
+        cache.delete(LOCK_KEY.format('key'))
+        self.assertEqual(fetch('key', compute, 60, version=2), 'new')
+        self.assertEqual(fetch('key', compute, 60, version=2), 'new')
+        compute.assert_called_once()
+
+    def test_concurrent_misses_compute_once(self):
+        release = threading.Event()
+        calls = []
+
+        def compute():
+            calls.append(1)
+            release.wait(5)
+            return ['value']
+
+        results = []
+        threads = [
+            threading.Thread(
+                target=lambda: results.append(fetch('key', compute, 60))
+            )
+            for _ in range(4)
+        ]
+        threads[0].start()
+        while 'key' not in page_cache._flights:
+            time.sleep(0.01)
+        flight = page_cache._flights['key']
+        for thread in threads[1:]:
+            thread.start()
+        while flight.waiters < 3:
+            time.sleep(0.01)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [['value']] * 4)
+        self.assertEqual(len({id(result) for result in results}), 4)
+
+    def start_leader(self, compute):
+        """Запускает поток-вычислитель и ждёт, пока он займёт `key`."""
+        results = []
+
+        def run():
+            try:
+                results.append(fetch('key', compute, 60))
+            except ValueError as error:
+                results.append(error)
+
+        leader = threading.Thread(target=run)
+        leader.start()
+        while 'key' not in page_cache._flights:
+            time.sleep(0.01)
+        return leader, results, run
+
+    def test_waiters_get_the_leaders_error(self):
+        release = threading.Event()
+        error = ValueError('boom')
+
+        def compute():
+            release.wait(5)
+            raise error
+
+        leader, results, run = self.start_leader(compute)
+        flight = page_cache._flights['key']
+        waiters = [threading.Thread(target=run) for _ in range(2)]
+        for waiter in waiters:
+            waiter.start()
+        while flight.waiters < 2:
+            time.sleep(0.01)
+        release.set()
+        for thread in [leader] + waiters:
+            thread.join(5)
+            self.assertFalse(thread.is_alive())
+        self.assertEqual(results, [error] * 3)
+        self.assertNotIn('key', page_cache._flights)
+        self.assertEqual(fetch('key', lambda: 'value', 60), 'value')
+
+    def test_waiter_computes_itself_after_timeout(self):
+        release = threading.Event()
+        leader, results, _ = self.start_leader(
+            lambda: release.wait(5) and 'leader'
+        )
+        with mock.patch.object(page_cache, 'FLIGHT_WAIT', 0.05), \
+                mock.patch.object(page_cache, 'LOCK_WAIT', 0.05):
+            self.assertEqual(fetch('key', lambda: 'waiter', 60), 'waiter')
+        release.set()
+        leader.join(5)
+        self.assertEqual(results, ['leader'])
+
+    def test_early_expiry_depends_on_compute_time(self):
+        entry = ('value', 1, time.time() + 10, 0.001)
+        with mock.patch.object(page_cache.random, 'random', return_value=0.5):
+            self.assertFalse(page_cache._expired(entry, 1))
+            self.assertTrue(page_cache._expired(entry[:3] + (100,), 1))
+            self.assertTrue(page_cache._expired(entry, 2))
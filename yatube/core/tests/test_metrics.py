@@ -0,0 +1,99 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post, User
+
+from .. import metrics
+
+
+class MetricsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='user')
+        Post.objects.create(author=cls.user, text='Текст')
+
+    def setUp(self):
+        cache.clear()
+        for store in metrics._stores:
+            store.clear()
+
+    def test_views_are_counted_by_route_name(self):
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:index'))
+        self.client.get('/unknown/')
+        text = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn(
+            'yatube_requests_total{view="posts:index",status="200"} 2', text
+        )
+        self.assertIn(
+            'yatube_requests_total{view="<unmatched>",status="404"} 1', text
+        )
+        self.assertIn(
+            'yatube_request_duration_seconds_bucket'
+            '{view="posts:index",le="+Inf"} 2', text
+        )
+        self.assertIn(
+            'yatube_response_size_bytes_count{view="posts:index"} 2', text
+        )
+        self.assertRegex(
+            text, r'yatube_db_queries_total\{view="posts:index"\} [1-9]'
+        )
+        self.assertRegex(
+            text, r'yatube_cache_hit_ratio\{view="posts:index"\} 0\.\d+'
+        )
+        self.assertIn(
+            '# TYPE yatube_thumbnail_saved_lookups_total counter', text
+        )
+        self.assertRegex(
+            text,
+            r'yatube_thumbnail_saved_lookups_total\{view="posts:index"\} \d'
+        )
+
+    def test_worker_files_are_summed(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with open(os.path.join(directory, '1.json'), 'w') as file:
+                json.dump(
+                    [[['requests_total', 'posts:index', '200'], 5]], file
+                )
+            with override_settings(METRICS_DIR=directory):
+                self.client.get(reverse('posts:index'))
+                text = self.client.get(reverse('metrics')).content.decode()
+                own = os.path.join(directory, f'{os.getpid()}.json')
+                self.assertTrue(os.path.exists(own))
+        self.assertIn(
+            'yatube_requests_total{view="posts:index",status="200"} 6', text
+        )
+
+    def test_dead_worker_files_are_retired(self):
+        """Файл завершившегося процесса убирается, его счётчики остаются."""
+        process = subprocess.Popen([sys.executable, '-c', ''])
+        process.wait()
+        rows = [[['requests_total', 'posts:index', '200'], 5]]
+        with tempfile.TemporaryDirectory() as directory:
+            dead = os.path.join(directory, f'{process.pid}.json')
+            for number in range(2):
+                with open(dead, 'w') as file:
+                    json.dump(rows, file)
+                with override_settings(METRICS_DIR=directory):
+                    text = self.client.get(
+                        reverse('metrics')
+                    ).content.decode()
+                self.assertFalse(os.path.exists(dead))
+                self.assertIn(
+                    'yatube_requests_total'
+                    f'{{view="posts:index",status="200"}} {5 * (number + 1)}',
+                    text
+                )
+
+    def test_metrics_are_internal(self):
+        response = self.client.get(
+            reverse('metrics'), REMOTE_ADDR='203.0.113.1'
+        )
+        self.assertEqual(response.status_code, 403)
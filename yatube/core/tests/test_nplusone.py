@@ -0,0 +1,60 @@
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse
+from django.template import engines
+from django.test import RequestFactory, TestCase, override_settings
+
+from posts.models import Post, User
+
+from ..nplusone import HEADER, NPlusOneMiddleware, query_shape
+
+TEMPLATE = '''{% for post in posts %}
+{{ post.author.username }}
+{% endfor %}'''
+
+
+@override_settings(NPLUSONE_SAMPLE_RATE=1, NPLUSONE_THRESHOLD=3)
+class NPlusOneMiddlewareTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for number in range(3):
+            author = User.objects.create_user(username=f'author{number}')
+            Post.objects.create(author=author, text='Текст')
+
+    def get(self, view):
+        request = RequestFactory().get('/')
+        with self.assertLogs('core.nplusone', 'WARNING') as logs:
+            response = NPlusOneMiddleware(view)(request)
+        return response, logs.output
+
+    def test_template_lazy_load_is_attributed(self):
+        def view(request):
+            template = engines['django'].from_string(TEMPLATE)
+            return HttpResponse(
+                template.render({'posts': Post.objects.all()})
+            )
+
+        response, output = self.get(view)
+        self.assertEqual(response[HEADER], '3x <unknown source>:2')
+        self.assertIn('auth_user', output[0])
+
+    def test_python_loop_is_attributed(self):
+        def view(request):
+            for post in Post.objects.all():
+                post.author
+            return HttpResponse()
+
+        response, _ = self.get(view)
+        self.assertRegex(
+            response[HEADER], r'^3x core/tests/test_nplusone\.py:\d+$'
+        )
+
+    def test_disabled_middleware_is_not_used(self):
+        with override_settings(NPLUSONE_SAMPLE_RATE=0):
+            with self.assertRaises(MiddlewareNotUsed):
+                NPlusOneMiddleware(lambda request: HttpResponse())
+
+    def test_query_shape_ignores_values(self):
+        self.assertEqual(
+            query_shape("SELECT * FROM t WHERE a = 1 AND b IN (%s, %s)"),
+            query_shape("SELECT * FROM t WHERE a = 22 AND b IN (%s, %s, %s)"),
+        )
@@ -0,0 +1,107 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection, connections
+from django.http import HttpResponse
+from django.test import (RequestFactory, TestCase, TransactionTestCase,
+                         override_settings)
+from django.urls import reverse
+
+from .. import replicas
+from ..queries import QueryCounter, execute_wrapper
+
+User = get_user_model()
+REPLICA = '/nonexistent/replica.sqlite3'
+
+
+def add_replica(test, path):
+    """Подключает файл `path` как replica_0 на время теста."""
+    connections.databases['replica_0'] = dict(
+        connection.settings_dict, NAME=f'file:{path}?mode=ro'
+    )
+    test.addCleanup(remove_replica)
+
+
+def remove_replica():
+    connections['replica_0'].close()
+    del connections.databases['replica_0']
+    if hasattr(connections._connections, 'replica_0'):
+        delattr(connections._connections, 'replica_0')
+    replicas._down.clear()
+
+
+@override_settings(DATABASE_REPLICAS=[REPLICA])
+class ReplicaTests(TestCase):
+    def setUp(self):
+        add_replica(self, REPLICA)
+
+    def test_unavailable_replica_falls_back_to_primary(self):
+        User.objects.create_user(username='reader')
+
+        @replicas.read_only
+        def view(request):
+            return HttpResponse(User.objects.count())
+
+        response = view(RequestFactory().get('/'))
+        self.assertEqual(response.content, b'1')
+        self.assertIn('replica_0', replicas._down)
+        # Исключённая реплика больше не выбирается.
+        self.assertIsNone(replicas.choose(RequestFactory().get('/')))
+
+    def test_writer_is_pinned_to_primary(self):
+        response = self.client.get(reverse('about:author'))
+        self.assertNotIn('use_primary', response.cookies)
+        User.objects.create_user(username='writer', password='secret')
+        response = self.client.post(
+            reverse('users:login'),
+            {'username': 'writer', 'password': 'secret'}
+        )
+        self.assertIn('use_primary', response.cookies)
+        request = RequestFactory().get('/')
+        request.COOKIES['use_primary'] = '1'
+        self.assertIsNone(replicas.choose(request))
+
+
+class ReplicatedFileTests(TransactionTestCase):
+    """Реплика — второй файл SQLite, который обновляет replicate."""
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        path = os.path.join(directory, 'replica.sqlite3')
+        replica_settings = override_settings(DATABASE_REPLICAS=[path])
+        replica_settings.enable()
+        self.addCleanup(replica_settings.disable)
+        add_replica(self, path)
+
+    def test_reads_go_to_replicated_file(self):
+        User.objects.create_user(username='replicated')
+        call_command('replicate', stdout=StringIO())
+        # Запись после копирования есть только в основной базе.
+        User.objects.create_user(username='lagging')
+
+        @replicas.read_only
+        def view(request):
+            return HttpResponse(','.join(User.objects.order_by(
+                'pk'
+            ).values_list('username', flat=True)))
+
+        replica_connection = connections['replica_0']
+        # Прагмы нового соединения не должны попасть в подсчёт.
+        replica_connection.ensure_connection()
+        primary, replica, total = (QueryCounter() for _ in range(3))
+        with connection.execute_wrapper(primary), \
+                replica_connection.execute_wrapper(replica), \
+                execute_wrapper(total):
+            response = view(RequestFactory().get('/'))
+        self.assertEqual(response.content, b'replicated')
+        self.assertEqual((primary.count, replica.count), (0, 1))
+        # Обёртки core.queries видят и запросы к репликам.
+        self.assertEqual(total.count, 1)
+        request = RequestFactory().get('/')
+        request.COOKIES['use_primary'] = '1'
+        self.assertEqual(view(request).content, b'replicated,lagging')
@@ -0,0 +1,32 @@
+import os
+import tempfile
+
+from django.db import connection
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.test import TestCase, override_settings
+
+from ..sqlite import pragmas
+
+
+class SQLitePragmaTests(TestCase):
+    def test_new_connection_is_tuned(self):
+        with tempfile.TemporaryDirectory() as directory:
+            wrapper = DatabaseWrapper(dict(
+                connection.settings_dict,
+                NAME=os.path.join(directory, 'db.sqlite3')
+            ))
+            try:
+                with wrapper.cursor() as cursor:
+                    cursor.execute('PRAGMA journal_mode')
+                    self.assertEqual(cursor.fetchone()[0], 'wal')
+                    cursor.execute('PRAGMA busy_timeout')
+                    self.assertEqual(cursor.fetchone()[0], 5000)
+                    cursor.execute('PRAGMA synchronous')
+                    self.assertEqual(cursor.fetchone()[0], 1)
+            finally:
+                wrapper.close()
+
+    @override_settings(SQLITE_PRAGMAS={'busy_timeout': '1; DROP TABLE x'})
+    def test_unsafe_pragma_rejected(self):
+        with self.assertRaises(ValueError):
+            pragmas()
@@ -0,0 +1,72 @@
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test import SimpleTestCase
+
+from ..sqlite_cache import SQLiteCache
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.location = os.path.join(self.directory, 'cache.sqlite3')
+        self.cache = self.make_cache()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def make_cache(self, **options):
+        options.setdefault('TOUCH_INTERVAL', 0)
+        return SQLiteCache(self.location, {'OPTIONS': options})
+
+    def test_set_get_and_many(self):
+        self.cache.set('one', {'value': 1})
+        self.cache.set_many({'two': 2, 'three': [3]})
+        self.assertEqual(self.cache.get('one'), {'value': 1})
+        self.assertEqual(
+            self.cache.get_many(['two', 'three', 'four']),
+            {'two': 2, 'three': [3]}
+        )
+        self.assertIsNone(self.cache.get('four'))
+
+    def test_shared_between_instances(self):
+        """Другой процесс с тем же файлом видит те же записи."""
+        self.cache.set('shared', 'value')
+        other = self.make_cache()
+        self.assertEqual(other.get('shared'), 'value')
+        other.delete('shared')
+        self.assertIsNone(self.cache.get('shared'))
+
+    def test_add_incr_and_timeouts(self):
+        self.assertTrue(self.cache.add('counter', 1))
+        self.assertFalse(self.cache.add('counter', 5))
+        self.assertEqual(self.cache.incr('counter'), 2)
+        self.assertEqual(self.cache.decr('counter', 2), 0)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+        self.cache.set('expired', 'value', timeout=-1)
+        self.assertFalse(self.cache.has_key('expired'))
+        self.assertTrue(self.cache.add('expired', 'fresh'))
+
+    def test_lru_eviction_by_size(self):
+        cache = self.make_cache(MAX_BYTES=3000)
+        for number in range(3):
+            cache.set(f'key{number}', 'x' * 900)
+        cache.get('key0')
+        cache.set('key3', 'x' * 900)
+        self.assertIsNone(cache.get('key1'))
+        self.assertEqual(len(cache.get_many(['key0', 'key2', 'key3'])), 3)
+        stats = cache.get_stats()
+        self.assertEqual(stats['evictions'], 1)
+        self.assertLessEqual(stats['bytes'], 3000)
+        self.assertEqual(stats['entries'], 3)
+        self.assertEqual(stats['misses'], 1)
+
+    def test_tests_use_their_own_cache_file(self):
+        """Тесты не трогают файл кэша запущенного сайта."""
+        self.assertNotEqual(
+            os.path.dirname(settings.CACHES['default']['LOCATION']),
+            settings.BASE_DIR
+        )
@@ -0,0 +1,45 @@
+import hashlib
+import os
+import shutil
+import tempfile
+
+from django.core.files.base import ContentFile
+from django.test import SimpleTestCase, override_settings
+
+from ..storage import ContentAddressedStorage
+
+
+class ContentAddressedStorageTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.storage = ContentAddressedStorage(location=self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_identical_uploads_share_one_file(self):
+        digest = hashlib.sha256(b'picture').hexdigest()
+        first = self.storage.save('posts/image.GIF', ContentFile(b'picture'))
+        second = self.storage.save('posts/copy.gif', ContentFile(b'picture'))
+        other = self.storage.save('posts/image.gif', ContentFile(b'other'))
+        self.assertEqual(
+            first, f'posts/{digest[:2]}/{digest[2:4]}/{digest}.gif'
+        )
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+        self.assertTrue(self.storage.is_hashed(first))
+        self.assertFalse(self.storage.is_hashed('posts/image.gif'))
+        with self.storage.open(first) as file:
+            self.assertEqual(file.read(), b'picture')
+        # Во временной папке хранилища не остаётся недописанных файлов.
+        self.assertEqual(os.listdir(self.directory), ['posts'])
+
+    @override_settings(IMAGE_RELEASE_GRACE=60)
+    def test_reused_file_is_kept_until_its_post_commits(self):
+        """Повторная загрузка освежает файл, и удалять его пока нельзя."""
+        name = self.storage.save('posts/image.gif', ContentFile(b'picture'))
+        os.utime(self.storage.path(name), (0, 0))
+        self.assertFalse(self.storage.is_recent(name))
+        self.storage.save('posts/copy.gif', ContentFile(b'picture'))
+        self.assertTrue(self.storage.is_recent(name))
+        self.assertEqual(os.listdir(self.directory), ['posts'])
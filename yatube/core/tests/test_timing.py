@@ -0,0 +1,40 @@
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from posts.models import Post, User
+
+
+class ServerTimingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='user')
+        cls.staff = User.objects.create_user(username='staff', is_staff=True)
+        Post.objects.create(author=cls.user, text='Текст')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_header_lists_parts_of_response_time(self):
+        response = self.client.get(reverse('posts:index'))
+        header = response['Server-Timing']
+        for name in ('db', 'cache', 'template', 'thumbnail', 'total'):
+            self.assertIn(f'{name};dur=', header)
+        self.assertRegex(header, r'db;dur=[\d.]+;desc="[1-9]\d* queries"')
+        self.assertRegex(
+            header, r'cache;dur=[\d.]+;desc="\d+ hits, \d+ misses"'
+        )
+
+    def test_staff_gets_profile(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('posts:index'), {'_profile': 1})
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        self.assertIn('function calls', response.content.decode())
+
+    def test_profile_is_staff_only(self):
+        self.client.force_login(self.user)
+        response = self.client.get(
+            reverse('posts:index'), HTTP_X_PROFILE='1'
+        )
+        self.assertTemplateUsed(response, 'posts/index.html')
+        self.assertIn('Server-Timing', response)
@@ -0,0 +1,77 @@
+from concurrent.futures import Future
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, OperationalError
+from django.test import RequestFactory, TestCase
+
+from ..writes import OverloadMiddleware, Overloaded, Unconfirmed, Writer
+
+User = get_user_model()
+
+
+class WriterTests(TestCase):
+    def test_burst_is_written_as_one_batch(self):
+        writer = Writer(size=10, batch=10, timeout=0)
+        futures = [
+            writer.put(User.objects.create_user, (username,), {})
+            for username in ('first', 'second', 'first', 'third')
+        ]
+        writer.write(writer.take())
+        self.assertTrue(writer.queue.empty())
+        self.assertEqual(futures[0].result().username, 'first')
+        # Ошибка одного изменения не откатывает остальные.
+        with self.assertRaises(IntegrityError):
+            futures[2].result()
+        self.assertEqual(
+            set(User.objects.values_list('username', flat=True)),
+            {'first', 'second', 'third'}
+        )
+
+    def test_full_queue_is_rejected(self):
+        writer = Writer(size=1, batch=1, timeout=0)
+        writer.put(User.objects.create_user, ('first',), {})
+        with self.assertRaises(Overloaded):
+            writer.put(User.objects.create_user, ('second',), {})
+        response = OverloadMiddleware(None).process_exception(
+            RequestFactory().post('/'), Overloaded()
+        )
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+
+    def test_failed_batch_gives_each_request_its_own_error(self):
+        writer = Writer(size=10, batch=10, timeout=0)
+        futures = [
+            writer.put(User.objects.create_user, (username,), {})
+            for username in ('first', 'second')
+        ]
+        with mock.patch(
+            'core.writes.host_lock', side_effect=OperationalError('locked')
+        ):
+            writer.write(writer.take())
+        errors = [future.exception() for future in futures]
+        self.assertIsNot(errors[0], errors[1])
+        for error in errors:
+            self.assertIsInstance(error, OperationalError)
+            self.assertIs(error.__cause__, errors[0].__cause__)
+
+    def test_timed_out_change_is_cancelled_or_reported(self):
+        writer = Writer(size=10, batch=10, timeout=0)
+        writer.start = lambda: None
+        with self.assertRaises(Overloaded) as raised:
+            writer.submit(User.objects.create_user, 'first')
+        self.assertNotIsInstance(raised.exception, Unconfirmed)
+        # Писатель пропускает отменённое изменение.
+        self.assertEqual(writer.take(), [])
+        self.assertFalse(User.objects.filter(username='first').exists())
+
+        running = Future()
+        running.set_running_or_notify_cancel()
+        writer.put = lambda *args: running
+        with self.assertRaises(Unconfirmed):
+            writer.submit(User.objects.create_user, 'second')
+        response = OverloadMiddleware(None).process_exception(
+            RequestFactory().post('/'), Unconfirmed()
+        )
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('могло сохраниться', response.content.decode())
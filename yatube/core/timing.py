@@ -0,0 +1,178 @@
+"""Разбивка времени ответа по частям и профилирование по запросу.
+
+ServerTimingMiddleware добавляет к каждому ответу заголовок
+Server-Timing: время и число запросов к БД, время и попадания кэша,
+время отрисовки шаблонов и поиска миниатюр. Замеры копятся в объекте
+Timings текущего потока; вне запроса `timer()` и `count()` ничего
+не делают.
+
+Сотрудник может запросить профиль одного запроса параметром `_profile`
+или заголовком X-Profile: запрос выполняется под cProfile, и вместо
+страницы возвращается отчёт, а если задан SERVER_PROFILE_DIR — профиль
+сохраняется в файл, имя которого приходит в заголовке X-Profile.
+"""
+import cProfile
+import io
+import os
+import pstats
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse
+from django.template.backends.django import DjangoTemplates
+from django.template.backends.django import Template as BackendTemplate
+from django.template.backends.django import reraise
+from django.template.exceptions import TemplateDoesNotExist
+
+from .queries import execute_wrapper
+
+PROFILE_PARAMETER = '_profile'
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+PROFILE_LINES = 60
+
+_local = threading.local()
+
+
+class Timings:
+    """Замеры одного запроса: длительности в секундах и счётчики."""
+
+    def __init__(self):
+        self.durations = Counter()
+        self.counts = Counter()
+        self.depth = Counter()
+
+    def header(self, total):
+        metrics = [
+            ('db', f"{self.counts['db']} queries"),
+            ('cache', '{} hits, {} misses'.format(
+                self.counts['cache_hits'], self.counts['cache_misses']
+            )),
+            ('template', None),
+            ('thumbnail', None),
+        ]
+        parts = [
+            f'{name};dur={self.durations[name] * 1000:.1f}'
+            + (f';desc="{description}"' if description else '')
+            for name, description in metrics
+        ]
+        parts.append(f'total;dur={total * 1000:.1f}')
+        return ', '.join(parts)
+
+
+def current():
+    return getattr(_local, 'timings', None)
+
+
+@contextmanager
+def timer(name):
+    """Добавляет время блока к замеру `name`.
+
+    Вложенный блок с тем же именем второй раз не считается.
+    """
+    timings = current()
+    if timings is None or timings.depth[name]:
+        yield
+        return
+    timings.depth[name] += 1
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.durations[name] += time.perf_counter() - started
+        timings.depth[name] -= 1
+
+
+def count(name, value=1):
+    timings = current()
+    if timings is not None:
+        timings.counts[name] += value
+
+
+def _time_query(execute, sql, params, many, context):
+    count('db')
+    with timer('db'):
+        return execute(sql, params, many, context)
+
+
+@contextmanager
+def collect():
+    """Собирает замеры блока; вложенный вызов получает внешние замеры."""
+    timings = current()
+    if timings is not None:
+        yield timings
+        return
+    _local.timings = timings = Timings()
+    try:
+        with execute_wrapper(_time_query):
+            yield timings
+    finally:
+        _local.timings = None
+
+
+class Template(BackendTemplate):
+    def render(self, context=None, request=None):
+        with timer('template'):
+            return super().render(context, request)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """Шаблоны Django, время отрисовки которых попадает в Server-Timing."""
+
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return Template(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+
+class ServerTimingMiddleware:
+    def __init__(self, get_response):
+        if not settings.SERVER_TIMING:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if self.wants_profile(request):
+            return self.profile(request)
+        started = time.perf_counter()
+        with collect() as timings:
+            response = self.get_response(request)
+        response['Server-Timing'] = timings.header(
+            time.perf_counter() - started
+        )
+        return response
+
+    def wants_profile(self, request):
+        if PROFILE_PARAMETER not in request.GET and (
+            PROFILE_HEADER not in request.META
+        ):
+            return False
+        return request.user.is_staff
+
+    def profile(self, request):
+        profiler = cProfile.Profile()
+        response = profiler.runcall(self.get_response, request)
+        directory = settings.SERVER_PROFILE_DIR
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            name = '{}-{:.0f}.prof'.format(
+                request.path.strip('/').replace('/', '_') or 'index',
+                time.time() * 1000
+            )
+            profiler.dump_stats(os.path.join(directory, name))
+            response['X-Profile'] = name
+            return response
+        report = io.StringIO()
+        pstats.Stats(profiler, stream=report).sort_stats(
+            'cumulative'
+        ).print_stats(PROFILE_LINES)
+        return HttpResponse(
+            report.getvalue(), content_type='text/plain; charset=utf-8'
+        )
@@ -0,0 +1,214 @@
+"""Очередь записей с единственным писателем.
+
+SQLite допускает одного писателя за раз, и при множестве одновременных
+публикаций воркеры ждут блокировку или получают «database is locked».
+Если WRITE_QUEUE включён, `submit` кладёт изменение в ограниченную
+очередь процесса, а поток-писатель выполняет все накопившиеся изменения
+одной транзакцией, каждое в своей точке сохранения. Писатели процессов
+одного хоста по очереди берут файловую блокировку WRITE_QUEUE_LOCK,
+поэтому с базой пишет только один из них. Запрос ждёт, пока его
+изменение зафиксировано, и получает результат или исключение.
+
+Заполненная очередь — признак перегрузки: запрос получает 503 и
+заголовок Retry-After вместо бесконечного ожидания. Если изменение не
+дождалось писателя, оно отменяется; если писатель уже взял его, ответ
+503 предупреждает, что изменение могло сохраниться.
+"""
+import os
+import queue
+import threading
+from concurrent.futures import Future, TimeoutError
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.http import HttpResponse
+
+from . import replicas
+
+try:
+    import fcntl
+except ImportError:  # Windows: блокировка только внутри процесса.
+    fcntl = None
+
+RETRY_AFTER = 1
+
+
+class Overloaded(Exception):
+    """Изменение не принято или отменено за WRITE_QUEUE_TIMEOUT."""
+
+    message = 'Сервер перегружен, изменение не сохранено.'
+
+
+class Unconfirmed(Overloaded):
+    """Изменение не зафиксировано вовремя, но ещё может зафиксироваться."""
+
+    message = (
+        'Сервер перегружен. Изменение могло сохраниться: проверьте это, '
+        'прежде чем повторять.'
+    )
+
+
+@contextmanager
+def host_lock(path):
+    """Блокировка писателя, общая для процессов одного хоста."""
+    if fcntl is None or not path:
+        yield
+        return
+    with open(path, 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class Writer:
+    def __init__(self, size, batch, timeout, lock_path=''):
+        self.size = size
+        self.batch = batch
+        self.timeout = timeout
+        self.lock_path = lock_path
+        self.queue = queue.Queue(maxsize=size)
+        self.thread = None
+        self.pid = None
+        self.start_lock = threading.Lock()
+
+    def start(self):
+        """Запускает поток-писатель; после fork — заново со своей очередью."""
+        with self.start_lock:
+            if self.thread is not None and self.pid == os.getpid():
+                return
+            self.queue = queue.Queue(maxsize=self.size)
+            self.thread = threading.Thread(
+                target=self.loop, name='writer', daemon=True
+            )
+            self.pid = os.getpid()
+            self.thread.start()
+
+    def put(self, function, args, kwargs):
+        future = Future()
+        try:
+            self.queue.put(
+                (future, function, args, kwargs), timeout=self.timeout
+            )
+        except queue.Full:
+            raise Overloaded('Очередь записей заполнена') from None
+        return future
+
+    def submit(self, function, *args, **kwargs):
+        self.start()
+        future = self.put(function, args, kwargs)
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            pass
+        # Изменение, которое писатель ещё не взял, отменяется.
+        if future.cancel():
+            raise Overloaded('Изменение не дождалось писателя') from None
+        raise Unconfirmed('Изменение не зафиксировано вовремя') from None
+
+    def take(self):
+        """Первое изменение из очереди и все, что накопились за ним.
+
+        Отменённые изменения пропускаются; взятые отменить уже нельзя.
+        """
+        jobs = [self.queue.get()]
+        while len(jobs) < self.batch:
+            try:
+                jobs.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return [job for job in jobs if job[0].set_running_or_notify_cancel()]
+
+    def apply(self, function, args, kwargs):
+        try:
+            with transaction.atomic():
+                return function(*args, **kwargs), None
+        except Exception as error:
+            return None, error
+
+    def write(self, jobs):
+        """Фиксирует пачку изменений одной транзакцией."""
+        try:
+            with host_lock(self.lock_path), transaction.atomic():
+                outcomes = [
+                    self.apply(function, args, kwargs)
+                    for future, function, args, kwargs in jobs
+                ]
+        except Exception as error:
+            # У каждого запроса своё исключение: поднятое в нескольких
+            # потоках сразу, одно исключение делило бы __traceback__.
+            outcomes = [(None, _copy(error)) for job in jobs]
+        for (future, *job), (result, error) in zip(jobs, outcomes):
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+    def loop(self):
+        while True:
+            jobs = self.take()
+            if jobs:
+                self.write(jobs)
+            close_old_connections()
+
+
+def _copy(error):
+    """Такое же исключение, как `error`, с ним в качестве причины."""
+    try:
+        copy = type(error)(*error.args)
+    except Exception:
+        copy = Exception(*error.args)
+    copy.__cause__ = error
+    return copy
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer():
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = Writer(
+                settings.WRITE_QUEUE_SIZE,
+                settings.WRITE_QUEUE_BATCH,
+                settings.WRITE_QUEUE_TIMEOUT,
+                settings.WRITE_QUEUE_LOCK,
+            )
+        return _writer
+
+
+def submit(function, *args, **kwargs):
+    """Выполняет изменение в транзакции и возвращает его результат.
+
+    Без WRITE_QUEUE изменение выполняется сразу в текущем потоке.
+    """
+    if not settings.WRITE_QUEUE:
+        with transaction.atomic():
+            return function(*args, **kwargs)
+    result = get_writer().submit(function, *args, **kwargs)
+    # Запись сделал поток-писатель; реплики должны узнать о ней здесь.
+    replicas.wrote()
+    return result
+
+
+class OverloadMiddleware:
+    """Отвечает 503, если очередь записей не справляется."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_exception(self, request, exception):
+        if not isinstance(exception, Overloaded):
+            return None
+        response = HttpResponse(
+            f'{exception.message} Повторите попытку позже.', status=503
+        )
+        response['Retry-After'] = str(RETRY_AFTER)
+        return response
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class PostsConfig(AppConfig):
     name = 'posts'
     verbose_name: str = 'Публикации'
+
+    def ready(self):
+        from . import fragments, signals  # noqa: F401
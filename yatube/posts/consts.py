@@ -1,2 +1,25 @@
 SLICE_OF_TEXT = 15
 POSTS_IN_PAGE = 10
+COMMENTS_IN_PAGE = 20
+# Авторы, у которых подписчиков больше этого числа, не раскладываются
+# по лентам при публикации: их посты подмешиваются в ленту при чтении.
+FEED_FANOUT_LIMIT = 1000
+FEED_BACKFILL_SIZE = 500
+FEED_BATCH_SIZE = 500
+PAGE_CACHE_TIMEOUT = 60 * 60 * 3
+CARD_CACHE_TIMEOUT = 60 * 60 * 24
+OBJECT_CACHE_TIMEOUT = 60 * 60 * 24
+# Лента в кэше хранит id последних постов; список, собранный из БД
+# одновременно с публикацией, может пропустить пост, поэтому живёт
+# недолго.
+TIMELINE_SIZE = 1000
+TIMELINE_CACHE_TIMEOUT = 60 * 10
+# Размеры миниатюр из шаблонов: они создаются заранее при сохранении поста.
+THUMBNAIL_GEOMETRIES = (
+    ('960x339', {'padding': True, 'upscale': True}),
+)
+THUMBNAIL_QUEUED_TIMEOUT = 60 * 10
+SEARCH_BATCH_SIZE = 1000
+SEARCH_QUERY_LENGTH = 200
+RECOUNT_CHUNK_SIZE = 5000
+TRANSFER_BATCH_SIZE = 2000
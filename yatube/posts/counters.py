@@ -0,0 +1,85 @@
+"""Счётчики постов, подписок и комментариев, хранящиеся в строках моделей.
+
+Сигналы меняют их одним запросом `UPDATE ... SET n = n + delta`, поэтому
+чтение счётчика не зависит от того, сколько записей он считает. Команда
+recount сверяет их с настоящими данными. Вместе со счётчиком обновляется
+и время изменения строки (`modified`): счётчики выводятся на страницах.
+"""
+from django.db.models import Count, F
+from django.utils import timezone
+
+from . import objects
+from .models import Comment, Follow, Group, Post, User, UserStats
+
+# (модель со счётчиком, поле счётчика, что считаем, поле-ссылка).
+COUNTERS = (
+    (UserStats, 'posts_count', Post, 'author_id'),
+    (UserStats, 'followers_count', Follow, 'author_id'),
+    (UserStats, 'following_count', Follow, 'user_id'),
+    (Post, 'comments_count', Comment, 'post_id'),
+    (Group, 'posts_count', Post, 'group_id'),
+)
+
+
+def change(model, pk, **deltas):
+    """Атомарно сдвигает счётчики строки; возвращает, нашлась ли она."""
+    values = {name: F(name) + delta for name, delta in deltas.items()}
+    found = bool(model.objects.filter(pk=pk).update(
+        modified=timezone.now(), **values
+    ))
+    if model in objects.CACHED_MODELS:
+        objects.forget(model, pk)
+    return found
+
+
+def change_stats(user_id, **deltas):
+    """Сдвигает счётчики пользователя, при росте создавая их строку.
+
+    При уменьшении строку не создаём: пользователь может удаляться
+    каскадом, и его счётчики уже удалены.
+    """
+    if change(UserStats, user_id, **deltas) or min(deltas.values()) < 0:
+        return
+    UserStats.objects.get_or_create(user_id=user_id)
+    change(UserStats, user_id, **deltas)
+
+
+def stats_of(user):
+    """Счётчики пользователя; нули, если строки ещё нет."""
+    try:
+        return user.stats
+    except UserStats.DoesNotExist:
+        return UserStats(user=user)
+
+
+def create_missing_stats(start, stop):
+    """Создаёт строки счётчиков пользователям с id из [start, stop)."""
+    ids = User.objects.filter(
+        pk__gte=start, pk__lt=stop, stats__isnull=True
+    ).values_list('pk', flat=True)
+    return len(UserStats.objects.bulk_create(
+        [UserStats(user_id=pk) for pk in ids], ignore_conflicts=True
+    ))
+
+
+def recount(counter, start, stop):
+    """Сверяет счётчик у строк с id из [start, stop).
+
+    Возвращает число исправленных строк.
+    """
+    model, field, source, key = counter
+    actual = dict(
+        source.objects.filter(**{
+            f'{key}__gte': start, f'{key}__lt': stop
+        }).values_list(key).annotate(total=Count('pk')).order_by()
+    )
+    now = timezone.now()
+    wrong = [
+        model(pk=pk, modified=now, **{field: actual.get(pk, 0)})
+        for pk, value in model.objects.filter(
+            pk__gte=start, pk__lt=stop
+        ).values_list('pk', field)
+        if value != actual.get(pk, 0)
+    ]
+    model.objects.bulk_update(wrong, [field, 'modified'])
+    return len(wrong)
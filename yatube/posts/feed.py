@@ -0,0 +1,232 @@
+"""Лента подписок с раскладкой постов по подписчикам при публикации.
+
+Посты обычных авторов копируются в таблицу FeedEntry каждого подписчика,
+поэтому страница ленты — это срез id постов по индексу
+(user, pub_date, post) и выборка постов по этим id. Посты авторов
+с очень большим числом подписчиков не раскладываются, а подмешиваются
+в ленту при чтении.
+"""
+import heapq
+from itertools import groupby
+from operator import itemgetter
+
+from django.db.models import Q
+
+from .consts import FEED_BACKFILL_SIZE, FEED_BATCH_SIZE, FEED_FANOUT_LIMIT
+from .models import FeedEntry, Follow, Post, UserStats
+from .utils import CursorPaginator
+
+
+def is_pulled(author_id):
+    """Посты автора читаются при открытии ленты, а не раскладываются."""
+    return UserStats.objects.filter(
+        user_id=author_id, followers_count__gte=FEED_FANOUT_LIMIT
+    ).exists()
+
+
+def pulled_authors(user):
+    """Авторы из подписок пользователя, чьи посты не раскладываются."""
+    return list(
+        Follow.objects.filter(
+            user=user,
+            author__stats__followers_count__gte=FEED_FANOUT_LIMIT
+        ).values_list('author_id', flat=True)
+    )
+
+
+def fan_out(post):
+    """Раскладывает новый пост по лентам подписчиков автора."""
+    if is_pulled(post.author_id):
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True)
+    FeedEntry.objects.bulk_create(
+        (
+            FeedEntry(
+                user_id=user_id,
+                post=post,
+                author_id=post.author_id,
+                pub_date=post.pub_date,
+            )
+            for user_id in followers.iterator()
+        ),
+        batch_size=FEED_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def _add_entries(user_ids, author_id, posts):
+    """Кладёт посты `posts` — пары (id, дата) — в ленты `user_ids`."""
+    FeedEntry.objects.bulk_create(
+        (
+            FeedEntry(
+                user_id=user_id,
+                post_id=post_id,
+                author_id=author_id,
+                pub_date=pub_date,
+            )
+            for user_id in user_ids
+            for post_id, pub_date in posts
+        ),
+        batch_size=FEED_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def _latest_posts(author_id):
+    return list(Post.objects.filter(
+        author_id=author_id
+    ).values_list('id', 'pub_date')[:FEED_BACKFILL_SIZE])
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту последние посты автора после подписки."""
+    if is_pulled(author_id):
+        return
+    _add_entries([user_id], author_id, _latest_posts(author_id))
+
+
+def restore_fan_out(author_id):
+    """Раскладывает посты автора, только что переставшего быть популярным.
+
+    После отписки, опустившей число подписчиков ниже FEED_FANOUT_LIMIT,
+    посты автора больше не подмешиваются при чтении ленты.
+    """
+    followers = UserStats.objects.filter(
+        user_id=author_id
+    ).values_list('followers_count', flat=True).first()
+    if followers != FEED_FANOUT_LIMIT - 1:
+        return
+    _add_entries(
+        Follow.objects.filter(
+            author_id=author_id
+        ).values_list('user_id', flat=True).iterator(),
+        author_id, _latest_posts(author_id)
+    )
+
+
+def trim(user_id, author_id):
+    """Убирает из ленты посты автора после отписки."""
+    FeedEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def rebuild():
+    """Заново раскладывает последние посты авторов по лентам подписчиков.
+
+    Подписки читаются по авторам, и посты автора выбираются один раз для
+    всех его подписчиков. Отдаёт число обработанных авторов.
+    """
+    FeedEntry.objects.all().delete()
+    follows = Follow.objects.order_by('author_id').values_list(
+        'author_id', 'user_id'
+    )
+    done = 0
+    for author_id, rows in groupby(follows.iterator(), key=itemgetter(0)):
+        if not is_pulled(author_id):
+            _add_entries(
+                [user_id for _, user_id in rows],
+                author_id, _latest_posts(author_id)
+            )
+        done += 1
+        yield done
+
+
+def _beyond(position, backwards, key):
+    """Условие «за ключом (дата, id)» для поля id `key`."""
+    lookup = 'gt' if backwards else 'lt'
+    moment, pk = position
+    return (
+        Q(**{f'pub_date__{lookup}': moment})
+        | Q(**{'pub_date': moment, f'{key}__{lookup}': pk})
+    )
+
+
+class Feed:
+    """Лента подписок пользователя от новых постов к старым.
+
+    Разложенные посты берутся срезом FeedEntry, посты популярных
+    авторов — запросом к Post с тем же ключом (дата, id), и обе части
+    сливаются. Поддерживает `count()` и срезы, как queryset, и выборку
+    за ключом для курсорной навигации.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self.authors = pulled_authors(user)
+
+    def parts(self):
+        """Запросы обеих частей ленты: (queryset, поле id)."""
+        parts = [(FeedEntry.objects.filter(user=self.user), 'post_id')]
+        if self.authors:
+            parts.append(
+                (Post.objects.filter(author_id__in=self.authors), 'pk')
+            )
+        return parts
+
+    def keys(self, position, backwards, stop):
+        """Первые `stop` пар (дата, id) за ключом `position`."""
+        sign = '' if backwards else '-'
+        streams = []
+        for queryset, key in self.parts():
+            if position is not None:
+                queryset = queryset.filter(
+                    _beyond(position, backwards, key)
+                )
+            streams.append(list(queryset.order_by(
+                f'{sign}pub_date', f'{sign}{key}'
+            ).values_list('pub_date', key)[:stop]))
+        keys, seen = [], set()
+        for row in heapq.merge(*streams, reverse=not backwards):
+            # Пост автора, ставшего популярным, может быть в обеих частях.
+            if row[1] in seen:
+                continue
+            seen.add(row[1])
+            keys.append(row)
+            if len(keys) == stop:
+                break
+        return keys
+
+    def posts(self, keys):
+        posts = Post.objects.select_related('author', 'group').in_bulk(
+            [pk for pub_date, pk in keys]
+        )
+        return [posts[pk] for pub_date, pk in keys if pk in posts]
+
+    def count(self):
+        """Число разных постов: пост может быть в обеих частях."""
+        querysets = [
+            queryset.order_by().values_list(key)
+            for queryset, key in self.parts()
+        ]
+        if len(querysets) == 1:
+            return querysets[0].count()
+        return querysets[0].union(*querysets[1:]).count()
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice) or index.step is not None:
+            raise TypeError('Поддерживаются только срезы без шага')
+        start = index.start or 0
+        if index.stop is None or index.stop <= start:
+            return []
+        return self.posts(self.keys(None, False, index.stop)[start:])
+
+    def fetch(self, position, backwards, limit):
+        if position is not None:
+            position = position[1:]
+        return self.posts(self.keys(position, backwards, limit))
+
+
+class FeedPaginator(CursorPaginator):
+    """Курсорная навигация по ленте подписок."""
+
+    def fetch(self, position, backwards, limit):
+        return self.object_list.fetch(position, backwards, limit)
+
+
+def get_feed(user):
+    """Посты ленты подписок пользователя."""
+    return Feed(user)
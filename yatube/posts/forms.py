@@ -1,6 +1,7 @@
 from django import forms
 
-from .models import Comment, Post
+from .consts import SEARCH_QUERY_LENGTH
+from .models import Comment, Group, Post, User
 
 
 class PostForm(forms.ModelForm):
@@ -13,3 +14,19 @@ class CommentForm(forms.ModelForm):
     class Meta:
         model = Comment
         fields = ('text',)
+
+
+class SearchForm(forms.Form):
+    q = forms.CharField(
+        label='Найти', max_length=SEARCH_QUERY_LENGTH,
+        widget=forms.TextInput(attrs={'placeholder': 'Что искать'})
+    )
+    author = forms.ModelChoiceField(
+        User.objects.all(), label='Автор', required=False,
+        to_field_name='username',
+        widget=forms.TextInput(attrs={'placeholder': 'Автор'})
+    )
+    group = forms.ModelChoiceField(
+        Group.objects.all(), label='Группа', required=False,
+        to_field_name='slug', empty_label='Все группы'
+    )
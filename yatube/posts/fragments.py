@@ -0,0 +1,31 @@
+"""Личные фрагменты страниц постов (см. core.personal)."""
+from core.personal import fragment
+
+from .forms import CommentForm
+from .models import Follow
+
+
+@fragment('switcher', 'posts/includes/switcher.html')
+def switcher(request):
+    return {}
+
+
+@fragment('follow_button', 'posts/includes/follow_button.html')
+def follow_button(request, author):
+    following = request.user.is_authenticated and Follow.objects.filter(
+        user=request.user, author__username=author
+    ).exists()
+    return {'author': author, 'following': following}
+
+
+@fragment('post_actions', 'posts/includes/post_actions.html')
+def post_actions(request, post, author):
+    return {
+        'post_id': post,
+        'can_edit': str(request.user.pk) == author,
+    }
+
+
+@fragment('comment_form', 'posts/includes/comment_form.html')
+def comment_form(request, post):
+    return {'post_id': post, 'form': CommentForm()}
@@ -0,0 +1,111 @@
+from urllib.parse import urlencode
+
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Follow, Group, Post
+
+
+def local_caches(number):
+    """Пустой кэш для страницы `number`.
+
+    Каждая страница проверяется на своём свежем кэше, иначе часть её
+    запросов заменили бы данные, закэшированные предыдущей страницей.
+    """
+    return {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': f'explain-queries-{number}',
+        },
+    }
+
+
+def is_problem(detail):
+    """Полный просмотр таблицы или сортировка во временном B-дереве."""
+    if 'TEMP B-TREE' in detail:
+        return True
+    return (
+        detail.startswith('SCAN ')
+        and 'USING' not in detail
+        and 'VIRTUAL TABLE' not in detail
+        and 'CONSTANT ROW' not in detail
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        'Выполняет EXPLAIN QUERY PLAN для запросов каждой страницы и '
+        'отмечает полные просмотры таблиц и сортировки во временном '
+        'B-дереве.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--problems-only', action='store_true',
+            help='Показывать только запросы с замечаниями.'
+        )
+
+    def pages(self):
+        """Страницы для проверки: (адрес, пользователь или None)."""
+        post = Post.objects.select_related('author').first()
+        if post is None:
+            raise CommandError('Нет ни одного поста для проверки')
+        group = Group.objects.filter(posts__isnull=False).first()
+        follow = Follow.objects.select_related('user').first()
+        reader = follow.user if follow else post.author
+        pages = [
+            (reverse('posts:index'), None),
+            (reverse('posts:profile', args=[post.author.username]), None),
+            (reverse('posts:post_detail', args=[post.pk]), None),
+            (reverse('posts:follow_index'), reader),
+            (reverse('posts:post_search') + '?' + urlencode(
+                {'q': post.text[:20]}
+            ), None),
+        ]
+        if group is not None:
+            pages.append((reverse('posts:group_list', args=[group.slug]),
+                          None))
+        return pages
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            return [row[-1] for row in cursor.fetchall()]
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Отчёт рассчитан на планы запросов SQLite')
+        problems = 0
+        for number, (url, user) in enumerate(self.pages()):
+            client = Client()
+            if user is not None:
+                client.force_login(user)
+            with override_settings(CACHES=local_caches(number)):
+                caches['default'].clear()
+                with CaptureQueriesContext(connection) as queries:
+                    client.get(url)
+            selects = [
+                query['sql'] for query in queries
+                if query['sql'].lstrip().upper().startswith('SELECT')
+            ]
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f'{url}: запросов {len(queries)}'
+            ))
+            for sql in selects:
+                plan = self.explain(sql)
+                flagged = [detail for detail in plan if is_problem(detail)]
+                problems += len(flagged)
+                if options['problems_only'] and not flagged:
+                    continue
+                self.stdout.write(f'  {sql}')
+                for detail in plan:
+                    if detail in flagged:
+                        self.stdout.write(self.style.WARNING(f'  ! {detail}'))
+                    else:
+                        self.stdout.write(f'    {detail}')
+        style = self.style.WARNING if problems else self.style.SUCCESS
+        self.stdout.write(style(f'Замечаний: {problems}'))
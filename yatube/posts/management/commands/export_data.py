@@ -0,0 +1,47 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.consts import TRANSFER_BATCH_SIZE
+from posts.transfer import FORMATS, TABLES, export_table
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает пользователей, группы, посты, комментарии и подписки '
+        'в каталог, по файлу JSONL или CSV на таблицу. Картинки '
+        'выгружаются именами файлов в хранилище.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory', help='Каталог для файлов.')
+        parser.add_argument(
+            '--format', choices=FORMATS, default='jsonl',
+            help='Формат файлов.'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=TRANSFER_BATCH_SIZE,
+            help='Сколько строк читать из БД за раз.'
+        )
+
+    def handle(self, *args, **options):
+        os.makedirs(options['directory'], exist_ok=True)
+        file_format = options['format']
+        for name, model, fields in TABLES:
+            path = os.path.join(
+                options['directory'], f'{name}.{file_format}'
+            )
+            started = time.monotonic()
+            with open(path, 'w', encoding='utf-8', newline='') as file:
+                count = export_table(
+                    model, fields, file, file_format, options['chunk_size']
+                )
+            elapsed = max(time.monotonic() - started, 1e-6)
+            self.stdout.write(
+                f'{name}: {count} строк за {elapsed:.1f} с '
+                f'({count / elapsed:.0f} строк/с)'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: {options["directory"]}'
+        ))
@@ -0,0 +1,77 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from sorl.thumbnail import delete as delete_image
+
+from core.cache import bump_tags
+from posts import objects
+from posts.models import Post
+from posts.thumbnails import source_file
+
+
+class Command(BaseCommand):
+    help = (
+        'Перекладывает картинки постов в раскладку по хешу содержимого '
+        'в нескольких потоках.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='Число потоков.'
+        )
+        parser.add_argument(
+            '--keep', action='store_true',
+            help='Не удалять исходные файлы.'
+        )
+
+    def rehash(self, name):
+        """Копирует файл под имя из хеша; None, если файла нет."""
+        try:
+            with self.storage.open(name) as file:
+                return name, self.storage.save(name, file)
+        except FileNotFoundError:
+            return name, None
+
+    def handle(self, *args, **options):
+        self.storage = Post._meta.get_field('image').storage
+        names = [
+            name for name in Post.objects.exclude(
+                image=''
+            ).values_list('image', flat=True).distinct()
+            if not self.storage.is_hashed(name)
+        ]
+        started = time.monotonic()
+        moved = {}
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            for done, (name, new_name) in enumerate(
+                pool.map(self.rehash, names), 1
+            ):
+                if new_name is None:
+                    self.stderr.write(f'[{done}/{len(names)}] нет {name}')
+                    continue
+                moved[name] = new_name
+                self.stdout.write(
+                    f'[{done}/{len(names)}] {name} -> {new_name}'
+                )
+        changed = list(Post.objects.filter(
+            image__in=moved
+        ).values_list('pk', flat=True))
+        with transaction.atomic():
+            for name, new_name in moved.items():
+                Post.objects.filter(image=name).update(image=new_name)
+        # update() не отправляет сигналов: посты и страницы со старыми
+        # адресами картинок сбрасываем сами.
+        objects.forget(Post, *changed)
+        bump_tags(*(f'post:{pk}' for pk in changed))
+        if not options['keep']:
+            for name in moved:
+                delete_image(source_file(name))
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: {len(moved)} картинок, '
+            f'{len(set(moved.values()))} уникальных, '
+            f'за {time.monotonic() - started:.1f} с'
+        ))
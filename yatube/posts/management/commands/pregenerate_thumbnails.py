@@ -0,0 +1,37 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+from posts.thumbnails import generate, init_worker
+
+
+class Command(BaseCommand):
+    help = 'Создаёт миниатюры всех картинок постов в нескольких процессах.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='Число процессов.'
+        )
+
+    def handle(self, *args, **options):
+        names = list(
+            Post.objects.exclude(
+                image=''
+            ).values_list('image', flat=True).distinct()
+        )
+        started = time.monotonic()
+        with ProcessPoolExecutor(
+            max_workers=options['workers'], initializer=init_worker
+        ) as pool:
+            for done, name in enumerate(
+                pool.map(generate, names, chunksize=8), 1
+            ):
+                self.stdout.write(f'[{done}/{len(names)}] {name}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: {len(names)} картинок '
+            f'за {time.monotonic() - started:.1f} с'
+        ))
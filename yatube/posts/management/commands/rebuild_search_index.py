@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from posts import search
+from posts.consts import SEARCH_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Заново строит полнотекстовый индекс постов пачками.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=SEARCH_BATCH_SIZE,
+            help='Сколько постов читать за один запрос.'
+        )
+
+    def handle(self, *args, **options):
+        if not search.is_enabled():
+            raise CommandError('Полнотекстовый индекс есть только на SQLite')
+        started = time.monotonic()
+        done = 0
+        # Пока индекс строится, поиск видит прежнюю его версию.
+        with transaction.atomic():
+            for done in search.rebuild(options['batch_size']):
+                self.stdout.write(f'Проиндексировано: {done}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: {done} постов за {time.monotonic() - started:.1f} с'
+        ))
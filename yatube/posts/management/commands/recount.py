@@ -0,0 +1,62 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Max
+
+from posts.consts import RECOUNT_CHUNK_SIZE
+from posts.counters import COUNTERS, create_missing_stats, recount
+from posts.models import User
+
+
+def _run(func, *args):
+    # Чтение идёт вне транзакции, запись — одним коротким bulk-запросом,
+    # чтобы потоки не держали блокировку SQLite друг против друга.
+    # У каждого потока своё соединение с БД; закрываем его по окончании.
+    try:
+        return func(*args)
+    finally:
+        connection.close()
+
+
+def _chunks(model, size):
+    last = model.objects.aggregate(last=Max('pk'))['last'] or 0
+    return [(start, start + size) for start in range(0, last + 1, size)]
+
+
+class Command(BaseCommand):
+    help = (
+        'Сверяет счётчики постов, подписок и комментариев с данными, '
+        'просматривая таблицы диапазонами id в нескольких потоках.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='Число потоков.'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=RECOUNT_CHUNK_SIZE,
+            help='Сколько id просматривать за один запрос.'
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        size = options['chunk_size']
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            created = sum(pool.map(
+                lambda chunk: _run(create_missing_stats, *chunk),
+                _chunks(User, size)
+            ))
+            jobs = [
+                (counter, start, stop)
+                for counter in COUNTERS
+                for start, stop in _chunks(counter[0], size)
+            ]
+            fixed = sum(pool.map(lambda job: _run(recount, *job), jobs))
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано строк счётчиков: {created}, исправлено: {fixed}, '
+            f'за {time.monotonic() - started:.1f} с'
+        ))
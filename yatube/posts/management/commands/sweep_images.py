@@ -0,0 +1,63 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.storage import UPLOAD_PREFIX
+from posts.models import Post
+from posts.signals import release_image
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет файлы картинок, на которые не ссылается ни один пост '
+        '(откаченные загрузки, отложенные удаления), и брошенные '
+        'временные файлы загрузок.'
+    )
+
+    def temporary_files(self, location):
+        """Недописанные загрузки старше IMAGE_RELEASE_GRACE."""
+        deadline = time.time() - settings.IMAGE_RELEASE_GRACE
+        for entry in os.scandir(location):
+            if (
+                entry.is_file() and entry.name.startswith(UPLOAD_PREFIX)
+                and entry.stat().st_mtime < deadline
+            ):
+                yield entry.path
+
+    def unreferenced(self, storage):
+        """Имена файлов хранилища, которых нет ни в одном посте."""
+        referenced = set(
+            Post.objects.exclude(
+                image=''
+            ).values_list('image', flat=True).distinct()
+        )
+        for directory, _, files in os.walk(storage.location):
+            for file_name in files:
+                name = os.path.relpath(
+                    os.path.join(directory, file_name), storage.location
+                ).replace(os.sep, '/')
+                if storage.is_hashed(name) and name not in referenced:
+                    yield name
+
+    def handle(self, *args, **options):
+        storage = Post._meta.get_field('image').storage
+        if not os.path.isdir(storage.location):
+            self.stdout.write('Картинок нет')
+            return
+        temporary = 0
+        for temporary, path in enumerate(
+            self.temporary_files(storage.location), 1
+        ):
+            os.remove(path)
+        removed = 0
+        for name in list(self.unreferenced(storage)):
+            # Ссылки и время загрузки перепроверяются под блокировкой.
+            release_image(name)
+            if not storage.exists(name):
+                removed += 1
+                self.stdout.write(f'Удалён {name}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено картинок: {removed}, временных файлов: {temporary}'
+        ))
@@ -1,12 +1,36 @@
 from django.contrib.auth import get_user_model
 from django.db import models
 
+from core.storage import ContentAddressedStorage
+
 from .consts import SLICE_OF_TEXT
 
 User = get_user_model()
 
 
-class Post(models.Model):
+class CountersMixin:
+    """Не перезаписывает счётчики при обычном сохранении модели.
+
+    Счётчики меняются только запросом `UPDATE ... SET n = n + 1`. Если
+    сохранить экземпляр, прочитанный раньше такого запроса, старое
+    значение затёрло бы новое, поэтому поля из `counters` в запрос на
+    обновление не попадают.
+    """
+    counters = ()
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            skipped = set(self.counters) | self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname not in skipped
+            ]
+        super().save(*args, **kwargs)
+
+
+class Post(CountersMixin, models.Model):
+    counters = ('comments_count',)
+
     text = models.TextField(
         'Текст поста',
         help_text='Введите текст поста'
@@ -34,22 +58,50 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
-        blank=True
+        storage=ContentAddressedStorage(),
+        blank=True,
+        # По имени файла считаются ссылки на общую картинку.
+        db_index=True
     )
+    comments_count = models.IntegerField(
+        'Комментариев', default=0, editable=False
+    )
+    # Меняется при правке поста и при новых комментариях.
+    modified = models.DateTimeField('Изменён', auto_now=True)
 
     class Meta:
         ordering = ['-pub_date']
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        # Ленты сортируются по (-pub_date, -id). Индекс по возрастанию
+        # SQLite читает с конца и получает этот порядок вместе с rowid;
+        # у индекса по убыванию rowid шёл бы в обратную сторону.
+        indexes = [
+            models.Index(
+                fields=['author', 'pub_date'],
+                name='post_author_pub_date_idx'
+            ),
+            models.Index(
+                fields=['group', 'pub_date'],
+                name='post_group_pub_date_idx'
+            ),
+        ]
 
     def __str__(self) -> str:
         return self.text[:SLICE_OF_TEXT]
 
 
-class Group(models.Model):
+class Group(CountersMixin, models.Model):
+    counters = ('posts_count',)
+
     title = models.CharField(max_length=200)
     slug = models.SlugField(unique=True)
     description = models.TextField()
+    posts_count = models.IntegerField(
+        'Записей', default=0, editable=False
+    )
+    # Меняется и при публикации, правке и удалении постов группы.
+    modified = models.DateTimeField('Изменён', auto_now=True)
 
     def __str__(self) -> str:
         return self.title
@@ -72,6 +124,14 @@ class Comment(models.Model):
     )
     created = models.DateTimeField(auto_now_add=True, db_index=True)
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['post', 'created'],
+                name='comment_post_created_idx'
+            ),
+        ]
+
     def __str__(self):
         return self.text
 
@@ -87,3 +147,72 @@ class Follow(models.Model):
         on_delete=models.CASCADE,
         related_name='following'
     )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'author'],
+                name='unique_follow'
+            ),
+        ]
+
+
+class UserStats(models.Model):
+    """Счётчики пользователя, которые меняются вместе с данными."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats'
+    )
+    posts_count = models.IntegerField('Постов', default=0)
+    followers_count = models.IntegerField('Подписчиков', default=0)
+    following_count = models.IntegerField('Подписок', default=0)
+    # Время последнего изменения профиля: постов автора и подписок.
+    modified = models.DateTimeField('Изменён', auto_now=True)
+
+    class Meta:
+        verbose_name = 'Счётчики пользователя'
+        verbose_name_plural = 'Счётчики пользователей'
+
+
+class FeedEntry(models.Model):
+    """Запись в ленте подписок пользователя, заполняется при публикации."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed'
+    )
+    post = models.ForeignKey(
+        'Post',
+        on_delete=models.CASCADE,
+        related_name='feed_entries'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-pub_date']
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_feed_entry'
+            ),
+        ]
+        indexes = [
+            # Страница ленты — срез по (pub_date, post) от конца индекса.
+            models.Index(
+                fields=['user', 'pub_date', 'post'],
+                name='feed_user_pub_date_idx'
+            ),
+            models.Index(
+                fields=['user', 'author'],
+                name='feed_user_author_idx'
+            ),
+        ]
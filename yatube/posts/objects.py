@@ -0,0 +1,106 @@
+"""Кэш строк постов, пользователей и групп по первичному ключу.
+
+Строки читаются пачкой через `load`: найденные в кэше берутся
+оттуда, остальные — одним запросом к БД на модель. Правка строки сбрасывает
+только её запись, а не страницы, на которых она выводится.
+"""
+from django.core.cache import cache
+from django.db import transaction
+
+from core.replicas import primary
+
+from .consts import OBJECT_CACHE_TIMEOUT
+from .models import Group, Post, User
+
+OBJECT_KEY = 'object:{label}:{pk}'
+CACHED_MODELS = (Post, User, Group)
+# Из строк пользователей карточкам нужны только имена: пароль, права
+# и прочее в общий кэш не попадают.
+CACHED_FIELDS = {User: ('id', 'username', 'first_name', 'last_name')}
+
+
+def _key(model, pk):
+    return OBJECT_KEY.format(label=model._meta.label_lower, pk=pk)
+
+
+def _queryset(model):
+    fields = CACHED_FIELDS.get(model)
+    if fields is None:
+        return model.objects.all()
+    return model.objects.only(*fields)
+
+
+def load(wanted):
+    """{модель: {pk: объект}} для {модель: ids} одним обращением к кэшу."""
+    keys = {
+        (model, pk): _key(model, pk)
+        for model, ids in wanted.items() for pk in ids
+    }
+    found = cache.get_many(list(keys.values())) if keys else {}
+    result = {model: {} for model in wanted}
+    missing = {}
+    for (model, pk), key in keys.items():
+        if key in found:
+            result[model][pk] = found[key]
+        else:
+            missing.setdefault(model, []).append(pk)
+    fetched = {}
+    for model, ids in missing.items():
+        with primary():
+            rows = _queryset(model).in_bulk(ids)
+        result[model].update(rows)
+        fetched.update({_key(model, pk): obj for pk, obj in rows.items()})
+    if fetched:
+        cache.set_many(fetched, OBJECT_CACHE_TIMEOUT)
+    return result
+
+
+def get_many(model, ids):
+    """{pk: объект} для тех `ids`, строки которых существуют."""
+    return load({model: ids})[model]
+
+
+def forget(model, *ids):
+    """Сбрасывает записи строк после фиксации текущей транзакции.
+
+    До фиксации читатель ещё видит прежние строки и вернул бы их в кэш.
+    """
+    keys = [_key(model, pk) for pk in ids]
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def get_posts(ids):
+    """Посты в порядке `ids`, без авторов и групп (см. with_related)."""
+    posts = get_many(Post, ids)
+    return [posts[pk] for pk in ids if pk in posts]
+
+
+def with_related(posts):
+    """Посты с авторами и группами из кэша объектов.
+
+    Все недостающие авторы и группы читаются одним обращением к кэшу,
+    уже загруженные (select_related) не трогаются. Посты удалённых
+    авторов пропускаются.
+    """
+    author = Post._meta.get_field('author')
+    group = Post._meta.get_field('group')
+    related = load({
+        User: {
+            post.author_id for post in posts if not author.is_cached(post)
+        },
+        Group: {
+            post.group_id for post in posts
+            if post.group_id and not group.is_cached(post)
+        },
+    })
+    result = []
+    for post in posts:
+        if not author.is_cached(post):
+            if post.author_id not in related[User]:
+                continue
+            post.author = related[User][post.author_id]
+        if post.group_id is not None and not group.is_cached(post):
+            # Удалённая группа обнуляется в постах без сигналов.
+            post.group = related[Group].get(post.group_id)
+        result.append(post)
+    return result
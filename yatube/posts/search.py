@@ -0,0 +1,184 @@
+"""Полнотекстовый поиск по тексту постов.
+
+На SQLite посты лежат в виртуальной таблице FTS5, которая обновляется
+сигналами при сохранении и удалении поста, а результаты упорядочены по
+релевантности (bm25). На других СУБД поиск сводится к фильтру по словам
+запроса и сортировке по дате.
+"""
+import re
+
+from django.db import connection
+
+from .models import Post
+from .utils import CursorPaginator, paginator
+
+TABLE = 'posts_post_fts'
+INSERT = (
+    f'INSERT INTO {TABLE} (rowid, text, author_id, group_id) '
+    'VALUES (%s, %s, %s, %s)'
+)
+TERM = re.compile(r'\w+')
+
+
+def is_enabled():
+    return connection.vendor == 'sqlite'
+
+
+def match_expression(query):
+    """Все слова запроса должны встретиться, хотя бы как начало слова."""
+    return ' '.join(f'"{term}"*' for term in TERM.findall(query))
+
+
+def index(post):
+    """Добавляет пост в индекс или обновляет его запись."""
+    if not is_enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', [post.pk])
+        cursor.execute(
+            INSERT, [post.pk, post.text, post.author_id, post.group_id]
+        )
+
+
+def unindex(post_id):
+    if not is_enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', [post_id])
+
+
+def rebuild(batch_size):
+    """Заново строит индекс, читая посты пачками по возрастанию id.
+
+    Отдаёт число проиндексированных постов после каждой пачки.
+    """
+    done, last_pk = 0, 0
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE}')
+        while True:
+            rows = list(
+                Post.objects.filter(pk__gt=last_pk).order_by('pk').values_list(
+                    'pk', 'text', 'author_id', 'group_id'
+                )[:batch_size]
+            )
+            if not rows:
+                break
+            cursor.executemany(INSERT, rows)
+            done, last_pk = done + len(rows), rows[-1][0]
+            yield done
+        cursor.execute(f"INSERT INTO {TABLE} ({TABLE}) VALUES ('optimize')")
+
+
+class Ranked:
+    """Найденные посты по убыванию релевантности.
+
+    Поддерживает `count()` и срезы, как queryset, и выборку за ключом
+    (ранг, id) для курсорной навигации. Ранг bm25 тем меньше, чем
+    релевантнее пост.
+    """
+
+    def __init__(self, query, author=None, group=None):
+        self.match = match_expression(query)
+        self.author = author
+        self.group = group
+
+    def where(self):
+        conditions, params = [f'{TABLE} MATCH %s'], [self.match]
+        if self.author is not None:
+            conditions.append('author_id = %s')
+            params.append(self.author.pk)
+        if self.group is not None:
+            conditions.append('group_id = %s')
+            params.append(self.group.pk)
+        return conditions, params
+
+    def select(self, conditions, params, order, limit, offset=0):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid, rank FROM {TABLE} '
+                f'WHERE {" AND ".join(conditions)} '
+                f'ORDER BY rank {order}, rowid {order} LIMIT %s OFFSET %s',
+                [*params, limit, offset]
+            )
+            rows = cursor.fetchall()
+        posts = Post.objects.select_related('author', 'group').in_bulk(
+            [pk for pk, rank in rows]
+        )
+        found = []
+        for pk, rank in rows:
+            # Пост мог быть удалён в обход сигналов до пересборки индекса.
+            if pk in posts:
+                posts[pk].rank = rank
+                found.append(posts[pk])
+        return found
+
+    def count(self):
+        if not self.match:
+            return 0
+        conditions, params = self.where()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT COUNT(*) FROM {TABLE} '
+                f'WHERE {" AND ".join(conditions)}',
+                params
+            )
+            return cursor.fetchone()[0]
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice) or index.step is not None:
+            raise TypeError('Поддерживаются только срезы без шага')
+        start = index.start or 0
+        if not self.match or index.stop is not None and index.stop <= start:
+            return []
+        limit = -1 if index.stop is None else index.stop - start
+        conditions, params = self.where()
+        return self.select(conditions, params, 'ASC', limit, start)
+
+    def fetch(self, position, backwards, limit):
+        if not self.match:
+            return []
+        conditions, params = self.where()
+        sign, order = ('<', 'DESC') if backwards else ('>', 'ASC')
+        if position is not None:
+            conditions.append(
+                f'(rank {sign} %s OR rank = %s AND rowid {sign} %s)'
+            )
+            params.extend([position[1], position[1], position[2]])
+        return self.select(conditions, params, order, limit)
+
+
+class RankedPaginator(CursorPaginator):
+    """Курсорная навигация по результатам поиска с ключом (ранг, id)."""
+
+    def __init__(self, object_list, per_page, **kwargs):
+        kwargs.update(key='rank', descending=False)
+        super().__init__(object_list, per_page, **kwargs)
+
+    def dump(self, value):
+        return repr(value)
+
+    def load(self, value):
+        return float(value)
+
+    def fetch(self, position, backwards, limit):
+        return self.object_list.fetch(position, backwards, limit)
+
+
+def search_page(request, query, author=None, group=None):
+    """Страница результатов поиска."""
+    if is_enabled():
+        return paginator(
+            request, Ranked(query, author, group),
+            cursor_class=RankedPaginator
+        )
+    post_list = Post.objects.select_related('author', 'group')
+    for term in TERM.findall(query):
+        post_list = post_list.filter(text__icontains=term)
+    if author is not None:
+        post_list = post_list.filter(author=author)
+    if group is not None:
+        post_list = post_list.filter(group=group)
+    return paginator(request, post_list)
@@ -0,0 +1,240 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+from sorl.thumbnail import delete as delete_image
+
+from core.cache import bump_tags
+
+from . import counters, feed, objects, search, thumbnails, timelines
+from .models import Comment, Follow, Group, Post, User, UserStats
+
+
+def after_commit(function, *args):
+    """Меняет кэш после фиксации транзакции, а не при сохранении.
+
+    До фиксации другие запросы ещё видят прежние строки: сброшенное
+    раньше они вернули бы в кэш устаревшим, а в ленту попал бы пост,
+    которого после отката нет.
+    """
+    transaction.on_commit(lambda: function(*args))
+
+
+# Счётчики обновляются первыми: от числа подписчиков зависит лента.
+@receiver(post_save, sender=Post)
+def count_saved_post(sender, instance, created, **kwargs):
+    if created:
+        counters.change_stats(instance.author_id, posts_count=1)
+    elif instance.group_id == instance._old_group_id:
+        return
+    elif instance._old_group_id is not None:
+        counters.change(Group, instance._old_group_id, posts_count=-1)
+    if instance.group_id is not None:
+        counters.change(Group, instance.group_id, posts_count=1)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    counters.change_stats(instance.author_id, posts_count=-1)
+    if instance.group_id is not None:
+        counters.change(Group, instance.group_id, posts_count=-1)
+
+
+@receiver(post_save, sender=Comment)
+def count_saved_comment(sender, instance, created, **kwargs):
+    if created:
+        counters.change(Post, instance.post_id, comments_count=1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    counters.change(Post, instance.post_id, comments_count=-1)
+
+
+@receiver(post_save, sender=Follow)
+def count_saved_follow(sender, instance, created, **kwargs):
+    if created:
+        counters.change_stats(instance.author_id, followers_count=1)
+        counters.change_stats(instance.user_id, following_count=1)
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(sender, instance, **kwargs):
+    counters.change_stats(instance.author_id, followers_count=-1)
+    counters.change_stats(instance.user_id, following_count=-1)
+
+
+@receiver(post_save, sender=User)
+def create_user_stats(sender, instance, created, **kwargs):
+    if created:
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, **kwargs):
+    if created:
+        feed.fan_out(instance)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_feed(sender, instance, created, **kwargs):
+    if created:
+        feed.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def trim_feed(sender, instance, **kwargs):
+    feed.trim(instance.user_id, instance.author_id)
+    feed.restore_fan_out(instance.author_id)
+
+
+@receiver(post_save, sender=Post)
+def touch_post_pages(sender, instance, created, **kwargs):
+    """Правка поста меняет профиль автора и страницы его групп."""
+    if created:
+        # Публикацию уже учли счётчики.
+        return
+    now = timezone.now()
+    UserStats.objects.filter(user=instance.author_id).update(modified=now)
+    Group.objects.filter(
+        pk__in={instance.group_id, instance._old_group_id} - {None}
+    ).update(modified=now)
+    objects.forget(Group, instance.group_id, instance._old_group_id)
+
+
+@receiver(post_save, sender=Post)
+def update_timelines(sender, instance, created, **kwargs):
+    if created:
+        for timeline in timelines.of_post(instance, instance.group_id):
+            after_commit(timeline.insert, instance)
+    elif instance.group_id != instance._old_group_id:
+        if instance._old_group_id is not None:
+            after_commit(
+                timelines.group(instance._old_group_id).remove, instance
+            )
+        if instance.group_id is not None:
+            after_commit(timelines.group(instance.group_id).insert, instance)
+
+
+@receiver(post_delete, sender=Post)
+def remove_from_timelines(sender, instance, **kwargs):
+    for timeline in timelines.of_post(instance, instance.group_id):
+        after_commit(timeline.remove, instance)
+
+
+@receiver([post_save, post_delete], sender=Post)
+@receiver([post_save, post_delete], sender=User)
+@receiver([post_save, post_delete], sender=Group)
+def forget_object(sender, instance, **kwargs):
+    objects.forget(sender, instance.pk)
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, **kwargs):
+    search.index(instance)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    search.unindex(instance.pk)
+
+
+@receiver(pre_save, sender=Post)
+def remember_post_state(sender, instance, **kwargs):
+    """Запоминает прежние группу и картинку поста."""
+    old_state = None
+    if instance.pk is not None:
+        old_state = Post.objects.filter(pk=instance.pk).values_list(
+            'group_id', 'image'
+        ).first()
+    instance._old_group_id, instance._old_image = old_state or (None, None)
+
+
+@receiver(post_save, sender=Post)
+def pregenerate_thumbnails(sender, instance, **kwargs):
+    old_image = getattr(instance, '_old_image', None)
+    if instance.image and instance.image.name != old_image:
+        thumbnails.schedule(instance.image.name)
+
+
+def release_image(name):
+    """Удаляет картинку и её миниатюры, если на неё не ссылается ни один пост.
+
+    Одинаковые картинки хранятся одним файлом, поэтому число ссылок на
+    файл — это число постов с таким же именем картинки. Вызывается после
+    фиксации транзакции, когда ссылки в БД окончательны. Файлы старой
+    раскладки, не переложенные командой migrate_images, не трогаем.
+    """
+    storage = Post._meta.get_field('image').storage
+    if not storage.is_hashed(name):
+        return
+    # Под блокировкой хранилища новая загрузка того же файла не может
+    # вклиниться между проверкой ссылок и удалением; недавно загруженный
+    # файл ждёт фиксации его поста (см. ContentAddressedStorage).
+    with storage.lock():
+        if storage.is_recent(name):
+            return
+        if Post.objects.filter(image=name).exists():
+            return
+        delete_image(thumbnails.source_file(name))
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def release_old_image(sender, instance, **kwargs):
+    if kwargs['signal'] is post_delete:
+        name = instance.image.name
+    else:
+        name = getattr(instance, '_old_image', None)
+        if name == instance.image.name:
+            return
+    if name:
+        after_commit(release_image, name)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_pages(sender, instance, **kwargs):
+    after_commit(bump_tags, f'post:{instance.pk}')
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_author_pages(sender, instance, created=True, **kwargs):
+    """Публикация и удаление меняют число постов на страницах автора."""
+    if created:
+        after_commit(bump_tags, f'author:{instance.author_id}')
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment_pages(sender, instance, **kwargs):
+    after_commit(bump_tags, f'post:{instance.post_id}')
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_group_pages(sender, instance, **kwargs):
+    after_commit(bump_tags, 'groups')
+
+
+@receiver(pre_save, sender=User)
+def remember_username(sender, instance, update_fields=None, **kwargs):
+    instance._username_changed = False
+    if instance.pk is None:
+        return
+    if update_fields is not None and 'username' not in update_fields:
+        return
+    instance._username_changed = not User.objects.filter(
+        pk=instance.pk, username=instance.username
+    ).exists()
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_pages(sender, instance, **kwargs):
+    # Имя пользователя выводится на многих страницах, а меняется редко.
+    if getattr(instance, '_username_changed', False):
+        after_commit(bump_tags, 'users')
+        UserStats.objects.filter(user=instance.pk).update(
+            modified=timezone.now()
+        )
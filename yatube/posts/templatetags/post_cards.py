@@ -0,0 +1,76 @@
+import hashlib
+
+from django import template
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from core.cache import TAG_KEY, get_tag_versions
+
+from .. import objects
+from ..consts import CARD_CACHE_TIMEOUT
+from ..thumbnails import resolve
+
+register = template.Library()
+
+CARD_KEY = 'card:{pk}:{digest}:{last:d}'
+CARD_TEMPLATE = 'includes/main.html'
+# Карточка показывает название группы и имя автора, поэтому устаревает
+# и при изменении групп или имён пользователей.
+CARD_TAGS = ('groups', 'users')
+
+
+def card_key(post, last):
+    """Ключ карточки меняется при любой правке поста."""
+    state = '|'.join((
+        post.text,
+        post.image.name or '',
+        str(post.group_id),
+        str(post.author_id),
+        post.pub_date.isoformat(),
+    ))
+    digest = hashlib.md5(state.encode()).hexdigest()
+    return CARD_KEY.format(pk=post.pk, digest=digest, last=last)
+
+
+@register.filter
+def post_cards(posts):
+    """HTML карточек постов страницы.
+
+    Все готовые карточки и версии их тегов читаются из кэша одним
+    запросом, отрисовываются только недостающие. Авторы, группы и
+    миниатюры нужны только им и тоже находятся одним запросом каждые.
+    """
+    posts = list(posts)
+    keys = [
+        card_key(post, number == len(posts))
+        for number, post in enumerate(posts, 1)
+    ]
+    tag_keys = [TAG_KEY.format(tag) for tag in CARD_TAGS]
+    found = cache.get_many(keys + tag_keys)
+    versions = [found.get(key) for key in tag_keys]
+    if None in versions:
+        versions = get_tag_versions(CARD_TAGS)
+    cards = {
+        key: mark_safe(found[key][1]) for key in keys
+        if key in found and found[key][0] == versions
+    }
+    missing = objects.with_related([
+        post for post, key in zip(posts, keys) if key not in cards
+    ])
+    resolve(missing)
+    rendered = {}
+    shown = {post.pk for post in missing}
+    for number, (post, key) in enumerate(zip(posts, keys), 1):
+        if key in cards or post.pk not in shown:
+            continue
+        cards[key] = render_to_string(CARD_TEMPLATE, {
+            'post': post,
+            'forloop': {'last': number == len(posts)},
+        })
+        # Карточку с исходной картинкой вместо миниатюры не кэшируем.
+        if not post.thumbnail_pending:
+            rendered[key] = (versions, str(cards[key]))
+    if rendered:
+        cache.set_many(rendered, CARD_CACHE_TIMEOUT)
+    return [cards[key] for key in keys if key in cards]
@@ -1,6 +1,13 @@
-from django.test import TestCase
+from django.core.cache import cache
+from django.test import TestCase, TransactionTestCase
 
-from ..models import SLICE_OF_TEXT, Group, Post, User
+from core.cache import get_tag_versions
+from core.writes import submit
+
+from .. import objects, timelines
+from ..counters import COUNTERS, recount
+from ..models import (SLICE_OF_TEXT, Comment, Follow, Group, Post, User,
+                      UserStats)
 from .consts import GROUP_DESCRIPTION, GROUP_SLUG, GROUP_TITLE, TEXT, USERNAME
 
 
@@ -34,3 +41,100 @@ class PostModelTest(TestCase):
         self.assertEqual(
             str(group), title, '__str__ выводит неправильную инфомацию'
         )
+
+
+class CountersTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username=USERNAME)
+        self.reader = User.objects.create_user(username='reader')
+        self.group = Group.objects.create(
+            title=GROUP_TITLE,
+            slug=GROUP_SLUG,
+            description=GROUP_DESCRIPTION,
+        )
+
+    def assertCounts(self, posts, followers, following, group_posts):
+        stats = UserStats.objects.get(user=self.user)
+        self.assertEqual(stats.posts_count, posts)
+        self.assertEqual(stats.followers_count, followers)
+        self.assertEqual(
+            UserStats.objects.get(user=self.reader).following_count,
+            following
+        )
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, group_posts)
+
+    def test_counters_follow_changes(self):
+        post = Post.objects.create(
+            author=self.user, text=TEXT, group=self.group
+        )
+        Follow.objects.create(user=self.reader, author=self.user)
+        Comment.objects.create(post=post, author=self.reader, text=TEXT)
+        self.assertCounts(1, 1, 1, 1)
+        # Сохранение устаревшего экземпляра не затирает счётчик.
+        post.group = None
+        post.save()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertCounts(1, 1, 1, 0)
+        Follow.objects.all().delete()
+        post.delete()
+        self.assertCounts(0, 0, 0, 0)
+
+    def test_recount_fixes_drift(self):
+        post = Post.objects.create(
+            author=self.user, text=TEXT, group=self.group
+        )
+        UserStats.objects.update(posts_count=7)
+        Post.objects.update(comments_count=3)
+        Group.objects.update(posts_count=0)
+        fixed = sum(
+            recount(counter, 0, 1000) for counter in COUNTERS
+        )
+        self.assertEqual(fixed, 4)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        self.assertCounts(1, 0, 0, 1)
+
+
+class CacheAfterCommitTest(TransactionTestCase):
+    """Кэш меняется, когда изменение зафиксировано, а не при сохранении."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username=USERNAME)
+        self.post = Post.objects.create(author=self.user, text=TEXT)
+
+    def test_read_before_commit_does_not_outlive_edit(self):
+        pk = self.post.pk
+        stale = objects.get_many(Post, [pk])[pk]
+        seen = {}
+
+        def edit():
+            post = Post.objects.get(pk=pk)
+            post.text = 'Правка'
+            post.save()
+            # Параллельный запрос прочёл строку до фиксации правки и
+            # кладёт её в кэш, а страницу — под текущей версией тега.
+            cache.set(objects._key(Post, pk), stale)
+            seen['versions'] = get_tag_versions([f'post:{pk}'])
+
+        submit(edit)
+        self.assertEqual(objects.get_many(Post, [pk])[pk].text, 'Правка')
+        self.assertNotEqual(
+            get_tag_versions([f'post:{pk}']), seen['versions']
+        )
+
+    def test_rolled_back_post_stays_out_of_timelines(self):
+        index = timelines.index()
+        index.entries()
+
+        def publish():
+            Post.objects.create(author=self.user, text=TEXT)
+            raise ValueError('Откат')
+
+        with self.assertRaises(ValueError):
+            submit(publish)
+        self.assertEqual(
+            [pk for pub_date, pk in index.entries()[0]], [self.post.pk]
+        )
@@ -0,0 +1,124 @@
+import os
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from PIL import Image
+
+from core import timing
+from core.storage import UPLOAD_PREFIX
+
+from ..models import Post, User
+from ..thumbnails import PregeneratedThumbnailBackend, generate, resolve
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class ThumbnailTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        content = BytesIO()
+        Image.new('RGB', (40, 20), 'red').save(content, 'PNG')
+        self.name = default_storage.save(
+            'posts/small.png', ContentFile(content.getvalue())
+        )
+        self.backend = PregeneratedThumbnailBackend()
+
+    def get_thumbnail(self):
+        return self.backend.get_thumbnail(
+            self.name, '960x339', padding=True, upscale=True
+        )
+
+    def test_render_does_not_process_images(self):
+        """Без готовой миниатюры страница получает исходную картинку."""
+        with mock.patch('posts.thumbnails.schedule') as schedule:
+            thumbnail = self.get_thumbnail()
+        schedule.assert_called_once_with(self.name)
+        self.assertEqual(thumbnail.name, self.name)
+
+    def test_pregenerated_thumbnail_is_used(self):
+        generate(self.name)
+        with mock.patch('posts.thumbnails.schedule') as schedule:
+            thumbnail = self.get_thumbnail()
+        schedule.assert_not_called()
+        self.assertNotEqual(thumbnail.name, self.name)
+        self.assertEqual(thumbnail.size, [960, 339])
+
+    def test_resolve_batches_lookups(self):
+        """Миниатюры страницы находятся одним запросом к кэшу."""
+        generate(self.name)
+        other = default_storage.save('posts/other.png', ContentFile(b''))
+        posts = [Post(image=self.name), Post(image=other), Post(image='')]
+        with mock.patch('posts.thumbnails.schedule') as schedule:
+            with mock.patch.object(
+                cache, 'get_many', wraps=cache.get_many
+            ) as get_many, timing.collect() as timings:
+                resolve(posts)
+        self.assertEqual(get_many.call_count, 1)
+        schedule.assert_called_once_with(other)
+        self.assertEqual(posts[0].thumbnail.size, [960, 339])
+        self.assertFalse(posts[0].thumbnail_pending)
+        self.assertEqual(posts[1].thumbnail.name, other)
+        self.assertTrue(posts[1].thumbnail_pending)
+        self.assertIsNone(posts[2].thumbnail)
+        self.assertEqual(timings.counts['thumbnail_lookups'], 2)
+        self.assertEqual(timings.counts['thumbnail_misses'], 1)
+        self.assertEqual(timings.counts['thumbnail_saved_lookups'], 1)
+
+    @override_settings(IMAGE_RELEASE_GRACE=0)
+    def test_identical_images_share_file_and_thumbnails(self):
+        """Файл картинки удаляется вместе с последним ссылающимся постом."""
+        author = User.objects.create_user(username='owner')
+        with open(default_storage.path(self.name), 'rb') as file:
+            content = file.read()
+        with mock.patch(
+            'posts.signals.transaction.on_commit', lambda func: func()
+        ):
+            first, second = (
+                Post.objects.create(
+                    author=author, text='Пост',
+                    image=SimpleUploadedFile(name, content, 'image/png')
+                ) for name in ('first.png', 'second.png')
+            )
+            self.assertEqual(first.image.name, second.image.name)
+            thumbnail = self.backend.get_thumbnail(
+                first.image, '960x339', padding=True, upscale=True
+            )
+            self.assertNotEqual(thumbnail.name, first.image.name)
+            first.delete()
+            self.assertTrue(first.image.storage.exists(second.image.name))
+            second.delete()
+            self.assertFalse(first.image.storage.exists(second.image.name))
+
+    def test_sweep_removes_orphaned_files(self):
+        """sweep_images убирает файлы без ссылок и брошенные загрузки."""
+        storage = Post._meta.get_field('image').storage
+        author = User.objects.create_user(username='owner')
+        kept = Post.objects.create(
+            author=author, text='Пост',
+            image=SimpleUploadedFile('kept.gif', b'kept', 'image/gif')
+        ).image.name
+        orphan = storage.save('posts/orphan.gif', ContentFile(b'orphan'))
+        upload = os.path.join(storage.location, UPLOAD_PREFIX + 'stale')
+        with open(upload, 'wb'):
+            pass
+        for path in (storage.path(kept), storage.path(orphan), upload):
+            os.utime(path, (0, 0))
+        call_command('sweep_images', stdout=StringIO())
+        self.assertTrue(storage.exists(kept))
+        self.assertFalse(storage.exists(orphan))
+        self.assertFalse(os.path.exists(upload))
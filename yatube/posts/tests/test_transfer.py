@@ -0,0 +1,116 @@
+import io
+import shutil
+import tempfile
+from datetime import datetime, timezone
+
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase
+
+from .. import feed
+from ..models import Comment, FeedEntry, Follow, Group, Post, User, UserStats
+from ..transfer import (FORMATS, TABLES, export_table, import_table,
+                        read_records)
+from .consts import GROUP_DESCRIPTION, GROUP_SLUG, GROUP_TITLE, TEXT, USERNAME
+
+
+class TransferTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username=USERNAME)
+        self.reader = User.objects.create_user(username='reader')
+        self.group = Group.objects.create(
+            title=GROUP_TITLE,
+            slug=GROUP_SLUG,
+            description=GROUP_DESCRIPTION,
+        )
+        self.post = Post.objects.create(
+            author=self.user, text=TEXT, group=self.group,
+            image='posts/ab/cdef.jpg'
+        )
+        self.pub_date = datetime(2020, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+        Post.objects.filter(pk=self.post.pk).update(pub_date=self.pub_date)
+        Comment.objects.create(post=self.post, author=self.reader, text=TEXT)
+        Follow.objects.create(user=self.reader, author=self.user)
+
+    def test_export_import_round_trip(self):
+        for file_format in FORMATS:
+            with self.subTest(file_format=file_format):
+                files = {}
+                for name, model, fields in TABLES:
+                    files[name] = io.StringIO()
+                    export_table(model, fields, files[name], file_format, 2)
+                User.objects.all().delete()
+                Group.objects.all().delete()
+                for name, model, fields in TABLES:
+                    files[name].seek(0)
+                    list(import_table(
+                        model, fields,
+                        read_records(files[name], file_format), 1
+                    ))
+                post = Post.objects.get(pk=self.post.pk)
+                self.assertEqual(post.pub_date, self.pub_date)
+                self.assertEqual(post.image.name, 'posts/ab/cdef.jpg')
+                self.assertEqual(post.group_id, self.group.pk)
+                self.assertTrue(Comment.objects.filter(post=post).exists())
+                self.assertTrue(Follow.objects.filter(
+                    user=self.reader, author=self.user
+                ).exists())
+
+    def test_feeds_rebuilt(self):
+        FeedEntry.objects.all().delete()
+        self.assertEqual(list(feed.rebuild()), [1])
+        self.assertTrue(FeedEntry.objects.filter(
+            user=self.reader, post=self.post
+        ).exists())
+
+
+class TransferCommandsTest(TransactionTestCase):
+    """export_data и import_data; recount пишет из своих потоков."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.user = User.objects.create_user(username=USERNAME)
+        self.reader = User.objects.create_user(username='reader')
+        self.group = Group.objects.create(
+            title=GROUP_TITLE,
+            slug=GROUP_SLUG,
+            description=GROUP_DESCRIPTION,
+        )
+        self.post = Post.objects.create(
+            author=self.user, text=TEXT, group=self.group
+        )
+        Comment.objects.create(post=self.post, author=self.reader, text=TEXT)
+        Follow.objects.create(user=self.reader, author=self.user)
+
+    def test_import_restores_counters_and_feeds(self):
+        for file_format in FORMATS:
+            with self.subTest(file_format=file_format):
+                call_command(
+                    'export_data', self.directory, format=file_format,
+                    stdout=io.StringIO()
+                )
+                User.objects.all().delete()
+                Group.objects.all().delete()
+                self.assertFalse(FeedEntry.objects.exists())
+                call_command(
+                    'import_data', self.directory, format=file_format,
+                    workers=2, stdout=io.StringIO()
+                )
+                author = UserStats.objects.get(user=self.user)
+                self.assertEqual(
+                    (author.posts_count, author.followers_count), (1, 1)
+                )
+                self.assertEqual(
+                    UserStats.objects.get(user=self.reader).following_count,
+                    1
+                )
+                self.assertEqual(
+                    Group.objects.get(pk=self.group.pk).posts_count, 1
+                )
+                self.assertEqual(
+                    Post.objects.get(pk=self.post.pk).comments_count, 1
+                )
+                self.assertEqual(
+                    list(FeedEntry.objects.values_list('user', 'post')),
+                    [(self.reader.pk, self.post.pk)]
+                )
@@ -1,13 +1,22 @@
 import tempfile
+import warnings
+from datetime import timedelta
+from unittest import mock
 
 from django.conf import settings
 from django.core.cache import cache
+from django.core.paginator import UnorderedObjectListWarning
+from django.db import connection, transaction
 from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
-from ..consts import POSTS_IN_PAGE
+from core.cache import bump_tags
+
+from .. import objects
+from ..consts import COMMENTS_IN_PAGE, POSTS_IN_PAGE
 from ..forms import PostForm
-from ..models import Follow, Group, Post, User
+from ..models import Comment, FeedEntry, Follow, Group, Post, User
 from .consts import GROUP_DESCRIPTION, GROUP_SLUG, GROUP_TITLE, TEXT, USERNAME
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
@@ -35,6 +44,13 @@ class PostPagesTests(TestCase):
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
         cache.clear()
+        # TestCase не фиксирует транзакции: сбросы кэша, отложенные до
+        # фиксации, выполняем сразу.
+        on_commit = mock.patch.object(
+            transaction, 'on_commit', lambda func: func()
+        )
+        on_commit.start()
+        self.addCleanup(on_commit.stop)
 
     def test_pages_uses_correct_template(self):
         """URL-адрес использует соответствующий шаблон."""
@@ -130,16 +146,310 @@ class PostPagesTests(TestCase):
         response = self.client.get(reverse('posts:index'))
         self.assertEqual(len(response.context['page_obj']), POSTS_IN_PAGE)
 
+    def test_cursor_paginator(self):
+        """Курсорные ссылки обходят ленту без повторов и без COUNT."""
+        for i in range(POSTS_IN_PAGE * 2):
+            Post.objects.create(author=self.user, text=TEXT, group=self.group)
+        url = reverse('posts:group_list', kwargs={'slug': GROUP_SLUG})
+        seen = []
+        query = ''
+        number = 0
+        while query is not None:
+            number += 1
+            with CaptureQueriesContext(connection) as queries:
+                response = self.guest_client.get(f'{url}?{query}')
+                page_obj = response.context['page_obj']
+                self.assertEqual(page_obj.number, number)
+                self.assertEqual(page_obj.has_previous(), number > 1)
+                self.assertEqual(
+                    page_obj.has_next(), page_obj.next_link is not None
+                )
+            seen.extend(post.pk for post in page_obj)
+            query = page_obj.next_link
+            self.assertFalse(
+                any('COUNT' in query['sql'] for query in queries)
+            )
+        expected = list(Post.objects.filter(
+            group=self.group
+        ).order_by('-pub_date', '-pk').values_list('pk', flat=True))
+        self.assertEqual(seen, expected)
+        response = self.guest_client.get(f'{url}?{page_obj.previous_link}')
+        self.assertEqual(
+            [post.pk for post in response.context['page_obj']],
+            expected[POSTS_IN_PAGE:POSTS_IN_PAGE * 2]
+        )
+        self.assertEqual(response.context['page_obj'].number, 2)
+
+    def test_search(self):
+        """Поиск ранжирует посты, фильтрует и листается курсором."""
+        other = User.objects.create_user(username='other')
+        best = Post.objects.create(
+            author=other, text='Котики котики котики'
+        )
+        for i in range(POSTS_IN_PAGE):
+            Post.objects.create(
+                author=self.user, group=self.group,
+                text=f'Про котиков и собак, часть {i}'
+            )
+        url = reverse('posts:post_search')
+        response = self.guest_client.get(url, {'q': 'котик'})
+        page_obj = response.context['page_obj']
+        self.assertEqual(page_obj[0], best)
+        self.assertEqual(len(page_obj), POSTS_IN_PAGE)
+        response = self.guest_client.get(f'{url}?{page_obj.next_link}')
+        self.assertEqual(len(response.context['page_obj']), 1)
+        response = self.guest_client.get(
+            url, {'q': 'котик', 'group': GROUP_SLUG, 'page': 2}
+        )
+        self.assertNotIn(best, response.context['page_obj'])
+        self.assertEqual(response.context['page_obj'].paginator.count, 10)
+        response = self.guest_client.get(
+            url, {'q': 'котик', 'author': 'other'}
+        )
+        self.assertEqual(list(response.context['page_obj']), [best])
+        best.text = 'Теперь про попугаев'
+        best.save()
+        response = self.guest_client.get(url, {'q': 'попугаев'})
+        self.assertEqual(list(response.context['page_obj']), [best])
+        Post.objects.get(pk=best.pk).delete()
+        response = self.guest_client.get(url, {'q': 'попугаев'})
+        self.assertEqual(list(response.context['page_obj']), [])
+
+    def test_comments_are_paginated(self):
+        """Комментарии приходят порциями, с авторами в том же запросе."""
+        Comment.objects.bulk_create(
+            Comment(post=self.post, author=self.user, text=f'Комментарий {i}')
+            for i in range(COMMENTS_IN_PAGE + 5)
+        )
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', UnorderedObjectListWarning)
+            response = self.guest_client.get(url)
+        comments = response.context['comments']
+        self.assertEqual(len(comments), COMMENTS_IN_PAGE)
+        self.assertEqual(comments[0].text, 'Комментарий 0')
+        self.assertIsNotNone(comments.next_cursor)
+        fragment = reverse(
+            'posts:post_comments', kwargs={'post_id': self.post.pk}
+        )
+        with CaptureQueriesContext(connection) as queries:
+            response = self.guest_client.get(
+                fragment, {'cursor': comments.next_cursor}
+            )
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(
+            [comment.text for comment in response.context['comments']],
+            [f'Комментарий {i}' for i in range(COMMENTS_IN_PAGE, 25)]
+        )
+        self.assertIsNone(response.context['comments'].next_cursor)
+        self.assertNotContains(response, 'Показать ещё')
+
+    @override_settings(QUERY_BUDGET_STRICT=True, THUMBNAIL_WORKERS=0)
+    def test_views_stay_within_query_budget(self):
+        """Число запросов страниц не растёт с числом постов на них."""
+        for i in range(POSTS_IN_PAGE):
+            author = User.objects.create_user(username=f'author{i}')
+            group = Group.objects.create(
+                title=f'Группа {i}', slug=f'group-{i}', description=''
+            )
+            Post.objects.create(author=author, group=self.group, text=TEXT)
+            Post.objects.create(author=self.user, group=group, text=TEXT)
+            Comment.objects.create(post=self.post, author=author, text=TEXT)
+            Follow.objects.create(user=self.user, author=author)
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': GROUP_SLUG}),
+            reverse('posts:profile', kwargs={'username': USERNAME}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+            reverse('posts:post_comments', kwargs={'post_id': self.post.pk}),
+            reverse('posts:follow_index'),
+            reverse('posts:post_search') + f'?q={TEXT}',
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                cache.clear()
+                response = self.authorized_client.get(url)
+                self.assertEqual(response.status_code, 200)
+
     def test_cache_index_page(self):
+        """Главная берётся из кэша, пока посты не изменились."""
         response = self.client.get(reverse('posts:index'))
         cache_response = response.content
-        Post.objects.all().delete()
+        Post.objects.update(text='Изменено в обход сигналов')
         response = self.client.get(reverse('posts:index'))
-        cache_content = response.content
-        cache.clear()
+        self.assertEqual(response.content, cache_response)
+        Post.objects.get(pk=self.post.pk).delete()
         response = self.client.get(reverse('posts:index'))
-        self.assertEqual(cache_response, cache_content)
-        self.assertNotEqual(cache_response, response)
+        self.assertNotEqual(response.content, cache_response)
+
+    def test_cache_invalidated_by_comment(self):
+        """Новый комментарий сбрасывает только страницу своего поста."""
+        detail = reverse('posts:post_detail', kwargs={'post_id': 1})
+        index = reverse('posts:index')
+        self.client.get(detail)
+        self.client.get(index)
+        self.authorized_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': 1}),
+            {'text': 'Свежий комментарий'}
+        )
+        self.assertContains(self.client.get(detail), 'Свежий комментарий')
+        self.assertTemplateNotUsed(
+            self.client.get(index), 'includes/main.html'
+        )
+
+    def test_cache_invalidated_by_new_post_of_author(self):
+        """Новый пост автора меняет число его постов на страницах постов."""
+        detail = reverse('posts:post_detail', kwargs={'post_id': 1})
+        count = Post.objects.filter(author=self.user).count()
+        self.assertContains(
+            self.client.get(detail), f'<span >{count}</span>'
+        )
+        Post.objects.create(author=self.user, text=TEXT)
+        self.assertContains(
+            self.client.get(detail), f'<span >{count + 1}</span>'
+        )
+
+    def test_post_cards_are_cached(self):
+        """Карточки постов отрисовываются заново только после правки."""
+        group_url = reverse('posts:group_list', kwargs={'slug': GROUP_SLUG})
+        response = self.guest_client.get(group_url)
+        self.assertTemplateUsed(response, 'includes/main.html')
+        bump_tags(f'group:{GROUP_SLUG}')
+        response = self.guest_client.get(group_url)
+        self.assertTemplateNotUsed(response, 'includes/main.html')
+        self.assertContains(response, self.post.text)
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Правка поста'
+        post.save()
+        response = self.guest_client.get(group_url)
+        self.assertTemplateUsed(response, 'includes/main.html')
+        self.assertContains(response, 'Правка поста')
+
+    def test_cached_cards_need_no_authors_or_groups(self):
+        """Готовым карточкам не нужны строки авторов и групп."""
+        index = reverse('posts:index')
+        self.assertContains(self.guest_client.get(index), USERNAME)
+        author = cache.get(objects._key(User, self.user.pk))
+        self.assertEqual(author.username, USERNAME)
+        self.assertNotIn('password', author.__dict__)
+        bump_tags('posts')
+        cache.delete_many([
+            objects._key(User, self.user.pk),
+            objects._key(Group, self.group.pk),
+        ])
+        with mock.patch.object(
+            cache, 'get_many', wraps=cache.get_many
+        ) as get_many, self.assertNumQueries(0):
+            response = self.guest_client.get(index)
+        self.assertTemplateNotUsed(response, 'includes/main.html')
+        self.assertContains(response, USERNAME)
+        keys = [key for call in get_many.call_args_list for key in call[0][0]]
+        self.assertFalse([key for key in keys if key.startswith((
+            objects._key(User, ''), objects._key(Group, '')
+        ))])
+
+    def test_logged_in_users_share_cached_page(self):
+        """Вошедшие получают общую страницу из кэша со своими фрагментами."""
+        reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=reader, author=self.user)
+        reader_client = Client()
+        reader_client.force_login(reader)
+        detail = reverse('posts:post_detail', kwargs={'post_id': 1})
+        response = reader_client.get(detail)
+        self.assertTemplateUsed(response, 'posts/post_detail.html')
+        self.assertContains(response, 'Пользователь: reader')
+        self.assertNotContains(response, 'Изменить пост')
+        response = self.authorized_client.get(detail)
+        self.assertTemplateNotUsed(response, 'posts/post_detail.html')
+        self.assertContains(response, f'Пользователь: {USERNAME}')
+        self.assertNotContains(response, 'reader')
+        self.assertContains(response, 'Изменить пост')
+        self.assertContains(response, 'csrfmiddlewaretoken')
+        self.assertIn('csrftoken', response.cookies)
+        profile = reverse('posts:profile', kwargs={'username': USERNAME})
+        self.assertContains(reader_client.get(profile), 'Отписаться')
+        self.assertContains(
+            self.authorized_client.get(profile), 'Подписаться'
+        )
+        response = self.guest_client.get(detail)
+        self.assertNotContains(response, '<!--personal')
+        self.assertContains(response, 'Войти')
+
+    def test_feeds_are_kept_as_id_lists(self):
+        """Публикация и правка не сбрасывают ленты, а меняют их на месте."""
+        index = reverse('posts:index')
+        group_url = reverse('posts:group_list', kwargs={'slug': GROUP_SLUG})
+        self.guest_client.get(index)
+        self.guest_client.get(group_url)
+        post = Post.objects.create(
+            author=self.user, group=self.group, text='Новый пост'
+        )
+        # Из кэша объектов выпали только новый пост и группа, у которой
+        # изменился счётчик постов.
+        with self.assertNumQueries(2):
+            self.assertContains(self.guest_client.get(index), 'Новый пост')
+        with self.assertNumQueries(0):
+            self.guest_client.get(index)
+        post.text = 'Правка нового поста'
+        post.group = None
+        post.save()
+        self.assertContains(
+            self.guest_client.get(index), 'Правка нового поста'
+        )
+        response = self.guest_client.get(group_url)
+        self.assertNotContains(response, 'Правка нового поста')
+        self.assertContains(response, self.post.text)
+        post.delete()
+        self.assertNotContains(self.guest_client.get(index), 'Правка')
+
+    def test_unchanged_pages_answer_not_modified(self):
+        """Повторный запрос неизменившейся страницы получает 304."""
+        detail = reverse('posts:post_detail', kwargs={'post_id': 1})
+        etag = self.guest_client.get(detail)['ETag']
+        with self.assertNumQueries(1):
+            response = self.guest_client.get(detail, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        response = self.authorized_client.get(
+            detail, HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 200)
+        Comment.objects.create(post=self.post, author=self.user, text=TEXT)
+        response = self.guest_client.get(detail, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+        profile = reverse('posts:profile', kwargs={'username': USERNAME})
+        since = self.guest_client.get(profile)['Last-Modified']
+        response = self.guest_client.get(
+            profile, HTTP_IF_MODIFIED_SINCE=since
+        )
+        self.assertEqual(response.status_code, 304)
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Правка поста'
+        with mock.patch('django.utils.timezone.now') as now:
+            now.return_value = post.modified + timedelta(seconds=1)
+            post.save()
+        response = self.guest_client.get(
+            profile, HTTP_IF_MODIFIED_SINCE=since
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_renames_change_etag(self):
+        """Переименование группы или автора меняет ETag страницы поста."""
+        detail = reverse('posts:post_detail', kwargs={'post_id': 1})
+        etag = self.guest_client.get(detail)['ETag']
+        group = Group.objects.get(pk=self.group.pk)
+        group.title = 'Новое название'
+        group.save()
+        response = self.guest_client.get(detail, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        user = User.objects.create_user(username='commenter')
+        Comment.objects.create(post=self.post, author=user, text=TEXT)
+        etag = self.guest_client.get(detail)['ETag']
+        user.username = 'renamed'
+        user.save()
+        response = self.guest_client.get(detail, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'renamed')
 
     def test_follow(self):
         follow_count = self.user.follower.all().count()
@@ -150,6 +460,19 @@ class PostPagesTests(TestCase):
         after_follow_count = self.user.follower.all().count()
         self.assertEqual(after_follow_count, follow_count + 1)
 
+    def test_follow_twice_keeps_one_subscription(self):
+        """Повторная подписка упирается в уникальность и не дублируется."""
+        user1 = User.objects.create_user(username='user')
+        url = reverse('posts:profile_follow', kwargs={'username': user1})
+        for _ in range(2):
+            response = self.authorized_client.get(url)
+            self.assertRedirects(
+                response, reverse('posts:profile', args=[user1.username])
+            )
+        self.assertEqual(
+            Follow.objects.filter(user=self.user, author=user1).count(), 1
+        )
+
     def test_unfollow(self):
         user1 = User.objects.create_user(username='user')
         self.authorized_client.get(reverse(
@@ -159,3 +482,95 @@ class PostPagesTests(TestCase):
         Follow.objects.get(user=self.user, author=user1).delete()
         after_unfollow_count = self.user.follower.all().count()
         self.assertEqual(after_unfollow_count, after_follow_count - 1)
+
+    def test_follow_index_reads_fanned_out_feed(self):
+        """Пост автора попадает в ленту подписчика и уходит при отписке."""
+        reader = User.objects.create_user(username='reader')
+        reader_client = Client()
+        reader_client.force_login(reader)
+        reader_client.get(reverse(
+            'posts:profile_follow', kwargs={'username': USERNAME})
+        )
+        new_post = Post.objects.create(author=self.user, text=TEXT)
+        self.assertTrue(
+            FeedEntry.objects.filter(user=reader, post=new_post).exists()
+        )
+        response = reader_client.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            list(response.context['page_obj']), [new_post, self.post]
+        )
+        reader_client.get(reverse(
+            'posts:profile_unfollow', kwargs={'username': USERNAME})
+        )
+        self.assertFalse(FeedEntry.objects.filter(user=reader).exists())
+
+    def test_feed_restored_when_author_is_no_longer_popular(self):
+        """Посты, опубликованные, пока автор был популярен, раскладываются."""
+        readers = []
+        for username in ('reader', 'other'):
+            reader_client = Client()
+            reader_client.force_login(
+                User.objects.create_user(username=username)
+            )
+            readers.append(reader_client)
+        with mock.patch('posts.feed.FEED_FANOUT_LIMIT', 2):
+            for reader_client in readers:
+                reader_client.get(reverse(
+                    'posts:profile_follow', kwargs={'username': USERNAME})
+                )
+            new_post = Post.objects.create(author=self.user, text=TEXT)
+            self.assertFalse(FeedEntry.objects.filter(post=new_post).exists())
+            readers[1].get(reverse(
+                'posts:profile_unfollow', kwargs={'username': USERNAME})
+            )
+            response = readers[0].get(reverse('posts:follow_index'))
+        self.assertTrue(FeedEntry.objects.filter(
+            user__username='reader', post=new_post
+        ).exists())
+        self.assertEqual(
+            list(response.context['page_obj']), [new_post, self.post]
+        )
+
+    def test_follow_index_pulls_popular_authors(self):
+        """Посты популярных авторов подмешиваются в ленту при чтении."""
+        reader = User.objects.create_user(username='reader')
+        reader_client = Client()
+        reader_client.force_login(reader)
+        with mock.patch('posts.feed.FEED_FANOUT_LIMIT', 1):
+            reader_client.get(reverse(
+                'posts:profile_follow', kwargs={'username': USERNAME})
+            )
+            new_post = Post.objects.create(author=self.user, text=TEXT)
+            response = reader_client.get(reverse('posts:follow_index'))
+        self.assertFalse(FeedEntry.objects.exists())
+        self.assertEqual(
+            list(response.context['page_obj']), [new_post, self.post]
+        )
+
+    @override_settings(QUERY_BUDGET_STRICT=True)
+    def test_feed_counts_posts_in_both_parts_once(self):
+        """Пост и из раскладки, и из подмешивания считается один раз."""
+        reader = User.objects.create_user(username='reader')
+        other = User.objects.create_user(username='other')
+        reader_client = Client()
+        reader_client.force_login(reader)
+        follow = reverse('posts:profile_follow', kwargs={'username': USERNAME})
+        with mock.patch('posts.feed.FEED_FANOUT_LIMIT', 2):
+            reader_client.get(follow)
+            for i in range(POSTS_IN_PAGE):
+                Post.objects.create(author=self.user, text=TEXT)
+            # Второй подписчик делает автора популярным: его посты уже
+            # разложены читателю и теперь ещё и подмешиваются.
+            Follow.objects.create(user=other, author=self.user)
+            total = POSTS_IN_PAGE + 1
+            self.assertEqual(
+                FeedEntry.objects.filter(user=reader).count(), total
+            )
+            url = reverse('posts:follow_index')
+            response = reader_client.get(url)
+            self.assertEqual(len(response.context['page_obj']), POSTS_IN_PAGE)
+            response = reader_client.get(url, {'page': 2})
+        page_obj = response.context['page_obj']
+        self.assertEqual(page_obj.paginator.count, total)
+        self.assertEqual(page_obj.paginator.num_pages, 2)
+        self.assertEqual(len(page_obj), 1)
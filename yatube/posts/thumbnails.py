@@ -0,0 +1,193 @@
+"""Миниатюры картинок постов создаются заранее, вне потока запроса.
+
+После сохранения поста с новой картинкой миниатюры всех размеров из
+THUMBNAIL_GEOMETRIES создаются в пуле процессов. При отрисовке страницы
+миниатюра только ищется в хранилище ключей sorl-thumbnail.
+"""
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, transaction
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import EMPTY_VALUE
+from sorl.thumbnail.models import KVStore
+
+from core import timing
+
+from .consts import THUMBNAIL_GEOMETRIES, THUMBNAIL_QUEUED_TIMEOUT
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+QUEUED_KEY = 'thumbnail:queued:{}'
+
+_pool = None
+
+
+def init_worker():
+    """Готовит процесс пула: свой Django и свои соединения с БД."""
+    django.setup()
+    connections.close_all()
+
+
+def source_file(name):
+    """Картинка поста по имени файла.
+
+    Ключи sorl-thumbnail зависят от класса хранилища, поэтому имя всегда
+    связывается с хранилищем поля `Post.image`, а не с хранилищем по
+    умолчанию.
+    """
+    return ImageFile(name, Post._meta.get_field('image').storage)
+
+
+def generate(name):
+    """Создаёт все миниатюры картинки; вызывается в процессе пула."""
+    backend = ThumbnailBackend()
+    for geometry, options in THUMBNAIL_GEOMETRIES:
+        backend.get_thumbnail(source_file(name), geometry, **options)
+    cache.delete(QUEUED_KEY.format(name))
+    return name
+
+
+def _log_failure(future):
+    if future.exception() is not None:
+        logger.error(
+            'Не удалось создать миниатюры', exc_info=future.exception()
+        )
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(
+            max_workers=settings.THUMBNAIL_WORKERS,
+            initializer=init_worker,
+        )
+    return _pool
+
+
+def schedule(name):
+    """Ставит создание миниатюр в очередь после фиксации транзакции."""
+    if not name or not cache.add(
+        QUEUED_KEY.format(name), True, THUMBNAIL_QUEUED_TIMEOUT
+    ):
+        return
+    if not settings.THUMBNAIL_WORKERS:
+        transaction.on_commit(lambda: generate(name))
+        return
+    transaction.on_commit(
+        lambda: get_pool().submit(generate, name).add_done_callback(
+            _log_failure
+        )
+    )
+
+
+class PregeneratedThumbnailBackend(ThumbnailBackend):
+    """Бэкенд sorl-thumbnail, который не обрабатывает картинки.
+
+    Готовая миниатюра берётся из хранилища ключей. Если её ещё нет,
+    создание ставится в очередь, а на странице показывается исходная
+    картинка.
+    """
+
+    def get_options(self, source, options):
+        if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(thumbnail_settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+        return options
+
+    @timing.timer('thumbnail')
+    def get_thumbnail(self, file_, geometry_string, **options):
+        if not file_:
+            raise ValueError('falsey file_ argument in get_thumbnail()')
+        if isinstance(file_, str):
+            file_ = source_file(file_)
+        source = ImageFile(file_)
+        options = self.get_options(source, options)
+        thumbnail = ImageFile(
+            self._get_thumbnail_filename(source, geometry_string, options),
+            default.storage
+        )
+        cached = default.kvstore.get(thumbnail)
+        if cached:
+            return cached
+        schedule(source.name)
+        return source
+
+
+def _get_raw_many(keys):
+    """Значения хранилища ключей sorl: сначала из кэша, затем из БД."""
+    kv_cache = default.kvstore.cache
+    found = kv_cache.get_many(keys)
+    missing = [key for key in keys if key not in found]
+    if missing:
+        rows = dict(
+            KVStore.objects.filter(
+                key__in=missing
+            ).values_list('key', 'value')
+        )
+        # Как и sorl, запоминаем в кэше и отсутствие значения.
+        stored = {key: rows.get(key, EMPTY_VALUE) for key in missing}
+        kv_cache.set_many(
+            stored, thumbnail_settings.THUMBNAIL_CACHE_TIMEOUT
+        )
+        found.update(stored)
+    return {
+        key: value for key, value in found.items() if value != EMPTY_VALUE
+    }
+
+
+@timing.timer('thumbnail')
+def resolve(posts):
+    """Находит миниатюры картинок всех постов одним обращением к кэшу.
+
+    Миниатюра записывается в `post.thumbnail`. Если её ещё нет,
+    создание ставится в очередь, в `post.thumbnail` попадает исходная
+    картинка, а `post.thumbnail_pending` становится истинным.
+    """
+    geometry, options = THUMBNAIL_GEOMETRIES[0]
+    backend = PregeneratedThumbnailBackend()
+    wanted = {}
+    for post in posts:
+        post.thumbnail, post.thumbnail_pending = None, False
+        if not post.image:
+            continue
+        source = ImageFile(post.image)
+        thumbnail = ImageFile(
+            backend._get_thumbnail_filename(
+                source, geometry, backend.get_options(source, dict(options))
+            ),
+            default.storage
+        )
+        key = add_prefix(thumbnail.key)
+        wanted.setdefault(key, (source, []))[1].append(post)
+    if not wanted:
+        return
+    found = _get_raw_many(list(wanted))
+    for key, (source, key_posts) in wanted.items():
+        if key in found:
+            thumbnail = deserialize_image_file(found[key])
+        else:
+            schedule(source.name)
+            thumbnail = source
+            timing.count('thumbnail_misses')
+        for post in key_posts:
+            post.thumbnail = thumbnail
+            post.thumbnail_pending = key not in found
+    # thumbnail_saved_lookups — сколько отдельных обращений к хранилищу
+    # ключей заменил один общий запрос.
+    timing.count('thumbnail_lookups', len(wanted))
+    timing.count('thumbnail_saved_lookups', len(wanted) - 1)
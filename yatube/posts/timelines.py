@@ -0,0 +1,135 @@
+"""Ленты главной, групп и авторов как списки id постов в кэше.
+
+Лента хранит пары (дата, id) последних TIMELINE_SIZE постов от новых
+к старым. Страница ленты — это срез списка и посты из кэша объектов
+(см. posts.objects); к БД обращаемся, только если список вытеснен или
+страница уходит глубже его конца. Создание и удаление поста правят
+списки на месте, под блокировкой в кэше.
+"""
+import time
+
+from django.core.cache import cache
+
+from core.cache import LOCK_KEY, LOCK_POLL, LOCK_TIMEOUT, LOCK_WAIT
+from core.replicas import primary
+
+from .consts import TIMELINE_CACHE_TIMEOUT, TIMELINE_SIZE
+from .models import Post
+from .objects import get_posts
+from .utils import CursorPaginator, paginator
+
+TIMELINE_KEY = 'timeline:{}'
+
+
+class Timeline:
+    def __init__(self, name, queryset):
+        self.key = TIMELINE_KEY.format(name)
+        self.queryset = queryset
+
+    def entries(self):
+        """(список пар (дата, id) от новых к старым, весь ли он)."""
+        value = cache.get(self.key)
+        if value is None:
+            with primary():
+                rows = list(self.queryset.order_by(
+                    '-pub_date', '-pk'
+                ).values_list('pub_date', 'pk')[:TIMELINE_SIZE + 1])
+            value = rows[:TIMELINE_SIZE], len(rows) <= TIMELINE_SIZE
+            cache.set(self.key, value, TIMELINE_CACHE_TIMEOUT)
+        return value
+
+    def _change(self, change):
+        lock = LOCK_KEY.format(self.key)
+        deadline = time.monotonic() + LOCK_WAIT
+        while not cache.add(lock, True, LOCK_TIMEOUT):
+            if time.monotonic() > deadline:
+                # Не дождались: пусть список соберётся из БД заново.
+                cache.delete(self.key)
+                return
+            time.sleep(LOCK_POLL)
+        try:
+            value = cache.get(self.key)
+            if value is not None:
+                cache.set(self.key, change(*value), TIMELINE_CACHE_TIMEOUT)
+        finally:
+            cache.delete(lock)
+
+    def insert(self, post):
+        def change(rows, complete):
+            rows = sorted(
+                rows + [(post.pub_date, post.pk)], reverse=True
+            )
+            if len(rows) > TIMELINE_SIZE:
+                return rows[:TIMELINE_SIZE], False
+            return rows, complete
+        self._change(change)
+
+    def remove(self, post):
+        self._change(lambda rows, complete: (
+            [row for row in rows if row[1] != post.pk], complete
+        ))
+
+
+def index():
+    return Timeline('index', Post.objects.all())
+
+
+def group(group_id):
+    return Timeline(
+        f'group:{group_id}', Post.objects.filter(group_id=group_id)
+    )
+
+
+def author(author_id):
+    return Timeline(
+        f'author:{author_id}', Post.objects.filter(author_id=author_id)
+    )
+
+
+def of_post(post, group_id):
+    """Ленты, в которые попадает пост, если он в группе `group_id`."""
+    timelines = [index(), author(post.author_id)]
+    if group_id is not None:
+        timelines.append(group(group_id))
+    return timelines
+
+
+class TimelinePaginator(CursorPaginator):
+    """Курсорная навигация по ленте из кэша.
+
+    Если нужная страница выходит за конец неполного списка, она
+    выбирается из БД, как в CursorPaginator.
+    """
+
+    def __init__(self, object_list, per_page, timeline, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.timeline = timeline
+
+    def fetch(self, position, backwards, limit):
+        rows, complete = self.timeline.entries()
+        start = 0
+        if position is not None:
+            key = position[1:]
+            start = next(
+                (
+                    number for number, row in enumerate(rows)
+                    if (row <= key if backwards else row < key)
+                ),
+                len(rows)
+            )
+        if backwards:
+            if start == len(rows) and not complete:
+                return super().fetch(position, backwards, limit)
+            rows = rows[max(start - limit, 0):start][::-1]
+        else:
+            rows = rows[start:start + limit]
+            if len(rows) < limit and not complete:
+                return super().fetch(position, backwards, limit)
+        return get_posts([pk for pub_date, pk in rows])
+
+
+def page(request, post_list, timeline):
+    """Страница ленты; `post_list` — те же посты запросом к БД."""
+    return paginator(
+        request, post_list, cursor_class=TimelinePaginator, timeline=timeline
+    )
@@ -0,0 +1,129 @@
+"""Выгрузка и загрузка данных блога пачками.
+
+Таблицы читаются итератором по возрастанию id, поэтому память не
+зависит от их размера; строки пишутся в JSONL или CSV, по файлу на
+таблицу. Картинки выгружаются ссылкой — именем файла в хранилище, сами
+файлы переносятся отдельно. Загрузка создаёт строки через bulk_create,
+который не отправляет сигналы моделей: счётчики, поисковый индекс и
+ленты подписок перестраиваются один раз после загрузки.
+"""
+import csv
+import json
+from contextlib import contextmanager
+from datetime import datetime
+from itertools import islice
+
+from django.core.management.color import no_style
+from django.db import connection, transaction
+
+from .models import Comment, Follow, Group, Post, User
+
+FORMATS = ('jsonl', 'csv')
+# Порядок таблиц: ссылки указывают только на уже загруженные строки.
+# Счётчики не выгружаются — они пересчитываются после загрузки.
+TABLES = (
+    ('users', User, (
+        'id', 'username', 'password', 'email', 'first_name', 'last_name',
+        'is_active', 'is_staff', 'is_superuser', 'last_login', 'date_joined',
+    )),
+    ('groups', Group, ('id', 'title', 'slug', 'description', 'modified')),
+    ('posts', Post, (
+        'id', 'text', 'pub_date', 'author_id', 'group_id', 'image',
+        'modified',
+    )),
+    ('comments', Comment, ('id', 'post_id', 'author_id', 'text', 'created')),
+    ('follows', Follow, ('id', 'user_id', 'author_id')),
+)
+
+
+def _dump(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def export_table(model, fields, file, file_format, chunk_size):
+    """Пишет строки таблицы в файл; возвращает их число."""
+    rows = model.objects.order_by('pk').values_list(*fields).iterator(
+        chunk_size=chunk_size
+    )
+    count = 0
+    if file_format == 'csv':
+        writer = csv.writer(file)
+        writer.writerow(fields)
+        for count, row in enumerate(rows, 1):
+            writer.writerow(
+                ['' if value is None else _dump(value) for value in row]
+            )
+        return count
+    for count, row in enumerate(rows, 1):
+        file.write(json.dumps(
+            dict(zip(fields, map(_dump, row))), ensure_ascii=False
+        ) + '\n')
+    return count
+
+
+def read_records(file, file_format):
+    """Строки файла словарями {поле: значение}."""
+    if file_format == 'csv':
+        return csv.DictReader(file)
+    return (json.loads(line) for line in file if line.strip())
+
+
+def _instance(model, fields, record):
+    values = {}
+    for field in fields:
+        value = record.get(field.attname)
+        # В CSV пустая строка обозначает NULL.
+        if value == '' and field.null:
+            value = None
+        values[field.attname] = (
+            None if value is None else field.to_python(value)
+        )
+    return model(**values)
+
+
+@contextmanager
+def keep_dates(model):
+    """Даты из файла не заменяются текущим временем (auto_now*)."""
+    fields = [
+        field for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False)
+        or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def import_table(model, fields, records, batch_size):
+    """Создаёт строки пачками, по транзакции на пачку.
+
+    Отдаёт число загруженных строк после каждой пачки.
+    """
+    fields = [model._meta.get_field(name) for name in fields]
+    instances = (_instance(model, fields, record) for record in records)
+    done = 0
+    with keep_dates(model):
+        while True:
+            batch = list(islice(instances, batch_size))
+            if not batch:
+                break
+            with transaction.atomic():
+                model.objects.bulk_create(batch)
+            done += len(batch)
+            yield done
+
+
+def reset_sequences(models):
+    """Новые строки получат id после загруженных."""
+    statements = connection.ops.sequence_reset_sql(no_style(), models)
+    if statements:
+        with connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
@@ -1,9 +1,187 @@
-from django.core.paginator import Paginator
+import base64
+import binascii
 
-from .consts import POSTS_IN_PAGE
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
 
+from . import objects
+from .consts import COMMENTS_IN_PAGE, POSTS_IN_PAGE
+from .models import Comment, Group, Post, UserStats
 
-def paginator(request, post_list):
-    paginator = Paginator(post_list, POSTS_IN_PAGE)
-    page_number = request.GET.get('page')
-    return paginator.get_page(page_number)
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+class CursorPaginator(Paginator):
+    """Постраничная навигация по ключу (дата, id) без COUNT и OFFSET.
+
+    Страница выбирается по индексу сразу после (или до) ключа крайней
+    записи соседней страницы, поэтому дальние страницы стоят столько же,
+    сколько первая. Ключ — поле с датой, `id` разрешает совпадения дат.
+    Курсор хранит и номер страницы, на которую ведёт.
+    """
+
+    def __init__(self, object_list, per_page, key='pub_date',
+                 descending=True, **kwargs):
+        self.key = key
+        self.descending = descending
+        # Paginator предупреждает о неупорядоченном запросе.
+        if hasattr(object_list, 'order_by'):
+            object_list = object_list.order_by(*self.ordering(False))
+        super().__init__(object_list, per_page, **kwargs)
+
+    def dump(self, value):
+        return value.isoformat()
+
+    def load(self, value):
+        value = parse_datetime(value)
+        if value is None:
+            raise ValueError('Некорректная дата в курсоре')
+        return value
+
+    def encode(self, direction, obj, number):
+        key = self.dump(getattr(obj, self.key))
+        value = f'{direction}{number}|{key}|{obj.pk}'
+        return base64.urlsafe_b64encode(value.encode()).decode()
+
+    def decode(self, cursor):
+        """Возвращает номер страницы и (направление, ключ, id).
+
+        Для первой страницы и испорченного курсора — (1, None).
+        """
+        if not cursor:
+            return 1, None
+        try:
+            value = base64.urlsafe_b64decode(cursor.encode()).decode()
+            number, key = value[1:].split('|', 1)
+            key, pk = key.rsplit('|', 1)
+            number, key, pk = int(number), self.load(key), int(pk)
+        except (binascii.Error, UnicodeError, ValueError):
+            return 1, None
+        if value[0] not in (NEXT, PREVIOUS):
+            return 1, None
+        return max(number, 1), (value[0], key, pk)
+
+    def ordering(self, backwards):
+        descending = self.descending != backwards
+        sign = '-' if descending else ''
+        return f'{sign}{self.key}', f'{sign}pk'
+
+    def beyond(self, moment, pk, backwards):
+        lookup = 'lt' if self.descending != backwards else 'gt'
+        return (
+            Q(**{f'{self.key}__{lookup}': moment})
+            | Q(**{self.key: moment, f'pk__{lookup}': pk})
+        )
+
+    def fetch(self, position, backwards, limit):
+        """Первые `limit` записей за ключом `position` в нужную сторону."""
+        object_list = self.object_list
+        if position is not None:
+            object_list = object_list.filter(
+                self.beyond(position[1], position[2], backwards)
+            )
+        object_list = object_list.order_by(*self.ordering(backwards))
+        return list(object_list[:limit])
+
+    def page(self, cursor=None):
+        number, position = self.decode(cursor)
+        backwards = position is not None and position[0] == PREVIOUS
+        items = self.fetch(position, backwards, self.per_page + 1)
+        has_more = len(items) > self.per_page
+        items = items[:self.per_page]
+        if backwards:
+            items.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, position is not None
+        number = max(number, 2) if has_previous else 1
+        # Page узнаёт о соседних страницах из num_pages: пробной записи
+        # за концом страницы достаточно, COUNT не нужен.
+        self.num_pages = number + 1 if has_next else number
+        page = Page(items, number, self)
+        page.next_cursor = page.previous_cursor = None
+        if items and has_next:
+            page.next_cursor = self.encode(NEXT, items[-1], number + 1)
+        if items and has_previous:
+            page.previous_cursor = self.encode(
+                PREVIOUS, items[0], max(number - 1, 1)
+            )
+        return page
+
+
+def _link(query, name, value):
+    query = query.copy()
+    query[name] = value
+    return query.urlencode()
+
+
+def paginator(request, post_list, per_page=POSTS_IN_PAGE,
+              cursor_class=CursorPaginator, **kwargs):
+    """Страница списка постов.
+
+    По умолчанию навигация курсорная; ссылки вида `?page=N` по-прежнему
+    работают через обычный Paginator.
+    """
+    query = request.GET.copy()
+    page_number = query.pop('page', [None])[-1]
+    cursor = query.pop('cursor', [None])[-1]
+    next_link = previous_link = None
+    if page_number is not None:
+        page_obj = Paginator(post_list, per_page).get_page(page_number)
+        if page_obj.has_next():
+            next_link = _link(query, 'page', page_obj.next_page_number())
+        if page_obj.has_previous():
+            previous_link = _link(
+                query, 'page', page_obj.previous_page_number()
+            )
+    else:
+        page_obj = cursor_class(post_list, per_page, **kwargs).page(cursor)
+        if page_obj.next_cursor:
+            next_link = _link(query, 'cursor', page_obj.next_cursor)
+        if page_obj.previous_cursor:
+            previous_link = _link(query, 'cursor', page_obj.previous_cursor)
+    page_obj.first_link = query.urlencode()
+    page_obj.next_link = next_link
+    page_obj.previous_link = previous_link
+    return page_obj
+
+
+def comments_page(post_id, cursor=None):
+    """Страница комментариев поста, от старых к новым, с авторами."""
+    comments = Comment.objects.filter(post_id=post_id).select_related('author')
+    return CursorPaginator(
+        comments, COMMENTS_IN_PAGE, key='created', descending=False
+    ).page(cursor)
+
+
+def post_tags(post_id):
+    """Теги страницы поста; число постов автора — под тегом автора."""
+    tags = [f'post:{post_id}', 'groups', 'users']
+    post = objects.get_many(Post, [post_id]).get(post_id)
+    if post is not None:
+        tags.append(f'author:{post.author_id}')
+    return tags
+
+
+def post_modified(post_id):
+    """Когда менялась страница поста: пост, комментарии, автор, группа."""
+    row = Post.objects.filter(pk=post_id).values_list(
+        'modified', 'author__stats__modified', 'group__modified'
+    ).first()
+    if row is None:
+        return None
+    return max(moment for moment in row if moment is not None)
+
+
+def profile_modified(username):
+    return UserStats.objects.filter(
+        user__username=username
+    ).values_list('modified', flat=True).first()
+
+
+def group_modified(slug):
+    return Group.objects.filter(
+        slug=slug
+    ).values_list('modified', flat=True).first()
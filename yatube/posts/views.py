@@ -1,26 +1,46 @@
 from django.contrib.auth.decorators import login_required
+from django.db import IntegrityError
 from django.shortcuts import get_object_or_404, redirect, render
-from django.views.decorators.cache import cache_page
 
-from .forms import CommentForm, PostForm
+from core.cache import cache_page_tagged
+from core.conditional import conditional
+from core.queries import query_budget
+from core.replicas import read_only
+from core.writes import submit
+
+from . import timelines
+from .consts import PAGE_CACHE_TIMEOUT
+from .counters import stats_of
+from .feed import FeedPaginator, get_feed
+from .forms import CommentForm, PostForm, SearchForm
 from .models import Follow, Group, Post, User
-from .utils import paginator
+from .search import search_page
+from .utils import (
+    comments_page, group_modified, paginator, post_modified, post_tags,
+    profile_modified
+)
 
 
-@cache_page(20, key_prefix="index_page")
+@read_only
+@query_budget(6)
 def index(request):
-    post_list = Post.objects.all()
-    page_obj = paginator(request, post_list)
+    post_list = Post.objects.select_related('author', 'group')
+    page_obj = timelines.page(request, post_list, timelines.index())
     context = {
         'page_obj': page_obj,
     }
     return render(request, 'posts/index.html', context)
 
 
+@read_only
+@conditional(group_modified, tags=('users',))
+@query_budget(7)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.all()
-    page_obj = paginator(request, post_list)
+    post_list = group.posts.select_related('author', 'group')
+    page_obj = timelines.page(
+        request, post_list, timelines.group(group.pk)
+    )
     context = {
         'group': group,
         'page_obj': page_obj,
@@ -28,41 +48,74 @@ def group_posts(request, slug):
     return render(request, 'posts/group_list.html', context)
 
 
+@read_only
+@conditional(profile_modified, tags=('groups', 'users'))
+@query_budget(8)
 def profile(request, username):
-    author = User.objects.get(username=username)
-    post_list = author.posts.all()
-    count = post_list.count()
-    page_obj = paginator(request, post_list)
-    following = False
-    if request.user.is_authenticated:
-        following = Follow.objects.filter(
-            user=request.user
-        ).filter(
-            author=author
-        ).exists()
+    author = User.objects.select_related('stats').get(username=username)
+    post_list = author.posts.select_related('author', 'group')
+    stats = stats_of(author)
+    page_obj = timelines.page(
+        request, post_list, timelines.author(author.pk)
+    )
     context = {
-        'count': count,
+        'count': stats.posts_count,
+        'stats': stats,
         'author': author,
         'page_obj': page_obj,
-        'following': following
     }
     return render(request, 'posts/profile.html', context)
 
 
+@read_only
+@conditional(post_modified, tags=('groups', 'users'))
+@cache_page_tagged(PAGE_CACHE_TIMEOUT, post_tags)
+@query_budget(3)
 def post_detail(request, post_id):
-    post = Post.objects.get(id=post_id)
-    count = Post.objects.filter(author=post.author).count()
-    comments = post.comments.all()
-    form = CommentForm()
+    post = Post.objects.select_related(
+        'author__stats', 'group'
+    ).get(id=post_id)
+    count = stats_of(post.author).posts_count
+    comments = comments_page(post.id, request.GET.get('comments'))
     context = {
         'count': count,
         'post': post,
         'comments': comments,
-        'form': form,
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+@query_budget(6)
+def post_search(request):
+    form = SearchForm(request.GET or None)
+    page_obj = None
+    if form.is_valid():
+        page_obj = search_page(
+            request,
+            form.cleaned_data['q'],
+            author=form.cleaned_data['author'],
+            group=form.cleaned_data['group'],
+        )
+    context = {
+        'form': form,
+        'page_obj': page_obj,
+    }
+    return render(request, 'posts/search.html', context)
+
+
+@cache_page_tagged(
+    PAGE_CACHE_TIMEOUT, lambda post_id: [f'post:{post_id}', 'users']
+)
+@query_budget(1)
+def post_comments(request, post_id):
+    """Следующая порция комментариев для подгрузки на странице поста."""
+    context = {
+        'post_id': post_id,
+        'comments': comments_page(post_id, request.GET.get('cursor')),
+    }
+    return render(request, 'posts/includes/comment_list.html', context)
+
+
 @login_required
 def post_create(request):
     form = PostForm(request.POST or None)
@@ -75,7 +128,7 @@ def post_create(request):
         return render(request, 'posts/create_post.html', context)
     post = form.save(commit=False)
     post.author = request.user
-    post.save()
+    submit(post.save)
     return redirect('posts:profile', post.author.username)
 
 
@@ -111,14 +164,18 @@ def add_comment(request, post_id):
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
+        submit(comment.save)
     return redirect('posts:post_detail', post_id=post_id)
 
 
+@read_only
 @login_required
+# Подписки на популярных авторов, две части ленты, посты и, для
+# ссылок ?page=N, число постов.
+@query_budget(5)
 def follow_index(request):
-    post_list = Post.objects.filter(author__following__user=request.user)
-    page_obj = paginator(request, post_list)
+    post_list = get_feed(request.user)
+    page_obj = paginator(request, post_list, cursor_class=FeedPaginator)
     context = {
         'page_obj': page_obj,
     }
@@ -130,15 +187,11 @@ def profile_follow(request, username):
     user = request.user
     author = User.objects.get(username=username)
     if user != author:
-        if not Follow.objects.filter(
-            user=user
-        ).filter(
-            author=author
-        ).exists():
-            Follow.objects.create(
-                user=user,
-                author=author
-            )
+        # Уникальность пары (user, author) проверяет сама БД.
+        try:
+            submit(Follow.objects.create, user=user, author=author)
+        except IntegrityError:
+            pass
     return redirect('posts:profile', username)
 
 
@@ -146,5 +199,5 @@ def profile_follow(request, username):
 def profile_unfollow(request, username):
     user = request.user
     author = User.objects.get(username=username)
-    Follow.objects.filter(user=user, author=author).delete()
+    submit(Follow.objects.filter(user=user, author=author).delete)
     return redirect('posts:profile', username)
@@ -10,17 +10,40 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
+import atexit
 import os
+import shutil
+import sys
+import tempfile
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Файл блокировки, под которой картинки постов создаются и удаляются.
+IMAGE_STORAGE_LOCK = os.path.join(BASE_DIR, 'images.lock')
+# Сколько секунд после загрузки файл картинки не удаляется: ссылка на
+# него появится, когда транзакция поста зафиксируется.
+IMAGE_RELEASE_GRACE = 300
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.sqlite_cache.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_BYTES': 256 * 1024 * 1024,
+        },
     }
 }
+# Тесты не должны читать и засорять кэш и картинки запущенного сайта:
+# им достаются свои файл кэша и MEDIA_ROOT во временном каталоге.
+TESTING = sys.argv[1:2] == ['test'] or 'pytest' in sys.modules
+if TESTING:
+    TEST_CACHE_DIR = tempfile.mkdtemp(prefix='yatube-cache-')
+    atexit.register(shutil.rmtree, TEST_CACHE_DIR, ignore_errors=True)
+    CACHES['default']['LOCATION'] = os.path.join(
+        TEST_CACHE_DIR, 'cache.sqlite3'
+    )
+    MEDIA_ROOT = os.path.join(TEST_CACHE_DIR, 'media')
 
 
 # Quick-start development settings - unsuitable for production
@@ -57,12 +80,47 @@ INSTALLED_APPS = [
     'sorl.thumbnail',
 ]
 
+THUMBNAIL_BACKEND = 'posts.thumbnails.PregeneratedThumbnailBackend'
+# Число процессов, создающих миниатюры; 0 — создавать в текущем потоке.
+THUMBNAIL_WORKERS = 2
+# Превышение бюджета запросов представления: исключение вместо записи
+# в лог. Включается в тестах.
+QUERY_BUDGET_STRICT = False
+# Доля запросов, в которых ищутся N+1 (0 — middleware отключён), и
+# сколько раз должна повториться форма запроса, чтобы о ней сообщить.
+NPLUSONE_SAMPLE_RATE = 0
+NPLUSONE_THRESHOLD = 5
+# Заголовок Server-Timing в ответах и каталог для профилей, снятых
+# по запросу сотрудника (пусто — профиль возвращается вместо страницы).
+SERVER_TIMING = True
+SERVER_PROFILE_DIR = ''
+# Метрики для Prometheus. Рабочие процессы сливают замеры в METRICS_DIR
+# раз в METRICS_FLUSH_INTERVAL секунд; без каталога каждый процесс
+# отдаёт только свои метрики.
+METRICS = True
+METRICS_DIR = os.getenv('METRICS_DIR', '')
+METRICS_FLUSH_INTERVAL = 5
+INTERNAL_IPS = ['127.0.0.1']
+# Очередь записей с одним писателем на хост (см. core.writes): размер
+# очереди, сколько изменений фиксировать одной транзакцией, сколько
+# секунд запрос ждёт места в очереди и фиксации, файл блокировки.
+WRITE_QUEUE = os.getenv('WRITE_QUEUE', '0') == '1'
+WRITE_QUEUE_SIZE = 1000
+WRITE_QUEUE_BATCH = 200
+WRITE_QUEUE_TIMEOUT = 10
+WRITE_QUEUE_LOCK = os.path.join(BASE_DIR, 'write.lock')
+
 MIDDLEWARE = [
+    'core.metrics.MetricsMiddleware',
+    'core.nplusone.NPlusOneMiddleware',
+    'core.replicas.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.timing.ServerTimingMiddleware',
+    'core.writes.OverloadMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -78,7 +136,8 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.timing.TimedDjangoTemplates',
+        'NAME': 'django',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -94,6 +153,8 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'yatube.wsgi.application'
+# Размер пула потоков, в которых ASGI-точка входа выполняет Django.
+ASGI_THREADS = 16
 
 
 # Database
@@ -103,8 +164,43 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # Соединение переживает запрос и закрывается через столько секунд.
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 600)),
     }
 }
+if TESTING:
+    # Тестовая база в памяти с общим кэшем блокирует таблицы целиком и
+    # не ждёт их освобождения: потоки recount получали бы «table is
+    # locked». Файловая база блокируется так же, как рабочая.
+    DATABASES['default']['TEST'] = {
+        'NAME': os.path.join(TEST_CACHE_DIR, 'test.sqlite3'),
+    }
+# Реплики только для чтения: пути к файлам через запятую. Их копирует
+# из основной базы команда replicate (см. core.replicas).
+DATABASE_REPLICAS = [
+    path for path in os.getenv('DATABASE_REPLICAS', '').split(',') if path
+]
+for number, path in enumerate(DATABASE_REPLICAS):
+    DATABASES[f'replica_{number}'] = dict(
+        DATABASES['default'],
+        NAME=f'file:{path}?mode=ro',
+        TEST={'MIRROR': 'default'},
+    )
+DATABASE_ROUTERS = ['core.replicas.ReplicaRouter']
+# Сколько секунд записавший посетитель читает из основной базы и на
+# сколько секунд исключается реплика, на которой случилась ошибка.
+REPLICA_PIN_COOKIE = 'use_primary'
+REPLICA_PIN_SECONDS = 10
+REPLICA_RETRY_SECONDS = 30
+# Прагмы каждого нового соединения с SQLite (см. core.sqlite).
+SQLITE_PRAGMAS = {
+    'journal_mode': os.getenv('SQLITE_JOURNAL_MODE', 'wal'),
+    'synchronous': os.getenv('SQLITE_SYNCHRONOUS', 'normal'),
+    'mmap_size': int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+    # Отрицательное значение — объём в КиБ, а не число страниц.
+    'cache_size': int(os.getenv('SQLITE_CACHE_SIZE', -64 * 1024)),
+    'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT', 5000)),
+}
 
 
 # Password validation